@@ -0,0 +1,92 @@
+"""
+资产分布饼图：原 pyplot 实现与 output.dist_card（PIL）的耗时
+    python benchmarks/dist_card.py
+"""
+
+import sys
+import time
+import random
+import timeit
+import numpy as np
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+import conftest  # noqa: F401  导入插件前设置配置
+from clovers_leafgame.output import dist_card
+
+
+def pyplot():
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def pyplot_dist_card(
+    dist: list[tuple[int, str]],
+    colors=[
+        "#351c75",
+        "#0b5394",
+        "#1155cc",
+        "#134f5c",
+        "#38761d",
+        "#bf9000",
+        "#b45f06",
+        "#990000",
+        "#741b47",
+    ],
+):
+    dist.sort(key=lambda x: x[0], reverse=True)
+    labels = []
+    x = []
+    sum_value = sum(d[0] for d in dist)
+    limit = 0.01 * sum_value
+    for n, (value, name) in enumerate(dist):
+        if n < 8 and value > limit:
+            x.append(value)
+            labels.append(name)
+        else:
+            labels.append("其他")
+            x.append(sum(seg[0] for seg in dist[n:]))
+            break
+    n += 1
+    output = BytesIO()
+
+    plt = pyplot()
+    plt.figure(figsize=(6.6, 3.4))
+    plt.pie(
+        np.array(x),
+        labels=[""] * n,
+        autopct=lambda pct: "" if pct < 1 else f"{pct:.1f}%",
+        colors=colors[0:n],
+        wedgeprops={"edgecolor": "none"},
+        textprops={"fontsize": 15},
+        pctdistance=1.2,
+        explode=[0, 0.1, 0.19, 0.27, 0.34, 0.40, 0.45, 0.49, 0.52][0:n],
+    )
+    plt.legend(labels, loc=(-0.6, 0), frameon=False)
+    plt.axis("equal")
+    plt.subplots_adjust(top=0.95, bottom=0.05, left=0.4, hspace=0, wspace=0)
+    plt.savefig(output, format="png", dpi=100, transparent=True)
+    plt.close()
+    canvas = Image.new("RGBA", (880, 340))
+    canvas.paste(Image.open(output), (220, 0))
+    return canvas
+
+
+rand = random.Random(16)
+cases = {
+    "1 项": [(1000, "金币")],
+    "3 项": [(rand.randint(1, 10**6), f"道具{i}") for i in range(3)],
+    "12 项": [(rand.randint(1, 10**6), f"道具{i}") for i in range(12)],
+}
+
+start = time.perf_counter()
+pyplot()
+print(f"导入 pyplot {(time.perf_counter() - start) * 1e3:.0f} ms")
+for name, dist in cases.items():
+    for label, func in (("pyplot", pyplot_dist_card), ("PIL", dist_card)):
+        func(list(dist))
+        t = min(timeit.repeat(lambda: func(list(dist)), number=5, repeat=3)) / 5
+        print(f"{name} {label:6} {t * 1e3:6.1f} ms")
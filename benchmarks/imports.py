@@ -0,0 +1,38 @@
+"""
+插件启动时导入各模块的耗时
+    python benchmarks/imports.py
+    按 PluginLoader 的加载顺序计时，先加载的模块包含共用依赖的导入时间
+"""
+
+import sys
+import time
+import resource
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+import conftest  # noqa: F401  导入插件前设置配置
+from clovers.core.plugin import PluginLoader
+
+times: dict[str, float] = {}
+load = PluginLoader.load
+
+
+def timed_load(name: str):
+    start = time.perf_counter()
+    try:
+        return load(name)
+    finally:
+        times[name] = time.perf_counter() - start
+
+
+PluginLoader.load = staticmethod(timed_load)
+start = time.perf_counter()
+import clovers_leafgame
+
+total = time.perf_counter() - start
+for name, t in times.items():
+    print(f"{name:45} {t * 1e3:7.0f} ms")
+print(f"{'clovers_leafgame':45} {total * 1e3:7.0f} ms（合计，含 main 与 output）")
+print(f"RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB")
+for module in ("matplotlib.pyplot", "pandas", "mplfinance"):
+    print(f"{module}：{'已导入' if module in sys.modules else '未导入'}")
@@ -0,0 +1,29 @@
+"""
+出售结算：逐份结算与 market.settle 的耗时
+    python benchmarks/settle.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "tests"))
+import conftest  # noqa: F401  导入插件前设置配置
+from test_market import settle_loop
+from clovers_leafgame.modules.market import core as market
+
+N = 10**6
+ISSUANCE = 10**7
+cases = {
+    "自动出售": (1e8, ISSUANCE, N, 0),
+    "报价出售（全部成交）": (1e12, ISSUANCE, N, 0.3),
+    "报价出售（部分成交）": (1e9, ISSUANCE, N, 95.0),
+}
+
+for name, args in cases.items():
+    assert int(market.settle(*args)[2]) == int(settle_loop(*args)[2])
+    loop = min(timeit.repeat(lambda: settle_loop(*args), number=1, repeat=3))
+    timer = timeit.Timer(lambda: market.settle(*args))
+    number, _ = timer.autorange()
+    closed = min(timer.repeat(number=number, repeat=5)) / number
+    print(f"{name} {N} 份：逐份 {loop * 1e3:.1f} ms，settle {closed * 1e6:.1f} us")
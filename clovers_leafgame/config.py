@@ -5,6 +5,29 @@ from pathlib import Path
 class Config(BaseModel):
     # 主路径
     main_path: str = str(Path("LeafGames").absolute())
+    # 存储方式：json，sqlite 或 shard（按群分片，群数据在第一次访问时加载）
+    # 首次切换到 sqlite 或 shard 时会自动导入 russian_data.json
+    storage: str = "json"
+    # json：增量保存多少次后进行一次完整保存
+    # shard：群数据连续多少次保存未修改后移出内存
+    compact_interval: int = 6
+    # 完整存档的格式：json 或 compact（无缩进，道具 id 去重，读取时跳过验证）
+    snapshot_format: str = "json"
+    # compact 格式是否使用 zlib 压缩
+    snapshot_compress: bool = True
+    # 每多少次备份保存一次完整备份，其余备份只保存与完整备份不同的记录
+    backup_base_interval: int = 6
+    # 备份保留：最近多少小时每小时一份，多少天每天一份，多少周每周一份
+    backup_retention: list[int] = [24, 7, 4]
+    # 头像缓存多少秒后重新验证
+    avatar_ttl: int = 86400
+    # 内存中缓存的头像数量
+    avatar_cache_size: int = 256
+    # 排行榜，市场信息等图片的缓存时间（秒），数据变化时会立即重新绘制
+    render_cache_ttl: int = 60
+    # 绘图进程数，为 0 时在主进程中绘图
+    # 绘图进程由 spawn 启动，机器人的启动脚本须有 if __name__ == "__main__" 保护
+    render_workers: int = 1
     # 默认显示字体
     fontname: str = "simsun"
     # 默认备用字体
@@ -0,0 +1,174 @@
+import json
+import time
+import asyncio
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from collections import OrderedDict
+import httpx
+from PIL import Image, ImageChops, ImageDraw
+
+THUMBNAIL_SIZES = (260, 60)
+"""资料卡与排行榜使用的头像尺寸"""
+
+
+class LRU[K, V](OrderedDict[K, V]):
+    """最近最少使用淘汰的字典"""
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key: K, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key: K, value: V):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def circle(data: bytes, size: int):
+    """解码图片并缩放为圆形缩略图"""
+    image = Image.open(BytesIO(data)).convert("RGBA").resize((size, size))
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse(((0, 0), (size, size)), fill=255)
+    image.putalpha(ImageChops.multiply(image.getchannel("A"), mask))
+    return image
+
+
+class AvatarCache:
+    """
+    头像缓存
+        内存：最近使用的原图与缩略图
+        磁盘：{url 的 sha1}.img 原图，.json 下载时间及 ETag，Last-Modified，_{尺寸}.png 圆形缩略图
+    原图超过 ttl 秒后带条件重新请求，304 时继续使用缓存；请求失败时使用过期的缓存
+    """
+
+    def __init__(self, path: Path, ttl: int = 86400, size: int = 256, timeout: float = 20) -> None:
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.images: LRU[str, tuple[bytes, dict]] = LRU(size)
+        self.thumbnails: LRU[tuple[str, int], Image.Image] = LRU(size * len(THUMBNAIL_SIZES))
+        self.pending: dict[str, asyncio.Task] = {}
+        """正在下载的 url，同一 url 的并发请求共用一次下载"""
+        self.tasks: set[asyncio.Task] = set()
+
+    def file(self, url: str, suffix: str):
+        return self.path / f"{hashlib.sha1(url.encode()).hexdigest()}{suffix}"
+
+    def load(self, url: str):
+        """从磁盘读取原图，在线程中执行"""
+        image_file = self.file(url, ".img")
+        meta_file = self.file(url, ".json")
+        if not (image_file.exists() and meta_file.exists()):
+            return None
+        try:
+            return image_file.read_bytes(), json.loads(meta_file.read_text())
+        except:
+            return None
+
+    def save(self, url: str, data: bytes | None, meta: dict):
+        """把原图写入磁盘并删除旧的缩略图，在线程中执行。data 为 None 时只更新 .json"""
+        if data is not None:
+            self.file(url, ".img").write_bytes(data)
+            for size in THUMBNAIL_SIZES:
+                self.file(url, f"_{size}.png").unlink(True)
+        self.file(url, ".json").write_text(json.dumps(meta))
+
+    async def read(self, url: str):
+        entry = self.images.get(url)
+        if entry is not None:
+            return entry
+        entry = await asyncio.to_thread(self.load, url)
+        if entry is not None:
+            self.images.put(url, entry)
+        return entry
+
+    async def write(self, url: str, data: bytes, meta: dict):
+        await asyncio.to_thread(self.save, url, data, meta)
+        for size in THUMBNAIL_SIZES:
+            self.thumbnails.pop((url, size), None)
+        self.images.put(url, (data, meta))
+
+    async def download(self, url: str, entry: tuple[bytes, dict] | None):
+        headers = {}
+        if entry:
+            meta = entry[1]
+            if etag := meta.get("etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := meta.get("last_modified"):
+                headers["If-Modified-Since"] = last_modified
+        try:
+            async with httpx.AsyncClient() as client:
+                resp = await client.get(url, headers=headers, timeout=self.timeout)
+            if resp.status_code == 304 and entry:
+                data, meta = entry
+                meta = meta | {"time": time.time()}
+                self.images.put(url, (data, meta))
+                await asyncio.to_thread(self.save, url, None, meta)
+                return data
+            resp.raise_for_status()
+        except:
+            return entry[0] if entry else None
+        data = resp.content
+        meta = {"time": time.time(), "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        await self.write(url, data, meta)
+        return data
+
+    async def fetch(self, url: str | None) -> bytes | None:
+        """头像原图"""
+        if not url:
+            return None
+        entry = await self.read(url)
+        if entry and time.time() - entry[1].get("time", 0) < self.ttl:
+            return entry[0]
+        if (task := self.pending.get(url)) is None:
+            task = self.pending[url] = asyncio.create_task(self.download(url, entry))
+            task.add_done_callback(lambda _: self.pending.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def thumbnail(self, url: str | None, size: int) -> Image.Image | None:
+        """圆形头像缩略图，粘贴时以自身作为蒙版"""
+        data = await self.fetch(url)
+        if data is None:
+            return None
+        if (image := self.thumbnails.get((url, size))) is not None:
+            return image
+        file = self.file(url, f"_{size}.png")
+
+        def load():
+            if file.exists():
+                try:
+                    return Image.open(file).copy()
+                except:
+                    pass
+            image = circle(data, size)
+            image.save(file)
+            return image
+
+        try:
+            image = await asyncio.to_thread(load)
+        except:
+            return None
+        self.thumbnails.put((url, size), image)
+        return image
+
+    def prefetch(self, url: str | None):
+        """在后台下载头像并生成全部尺寸的缩略图"""
+        if not url:
+            return
+
+        async def task():
+            for size in THUMBNAIL_SIZES:
+                await self.thumbnail(url, size)
+
+        t = asyncio.create_task(task())
+        self.tasks.add(t)
+        t.add_done_callback(self.tasks.discard)
@@ -0,0 +1,70 @@
+from io import BytesIO
+from pathlib import Path
+from PIL import Image, ImageFilter
+from PIL.Image import Image as IMG
+from .avatar import LRU
+
+BG_SIZE = (920, 1600)
+"""背景缩小到刚好覆盖的尺寸，资料卡宽 920，大多数资料卡低于 1600"""
+BLUR_RADIUS = 4
+
+cache: LRU[tuple[Path, bool], tuple[int, IMG]] = LRU(32)
+"""
+已解码的背景：(背景, 是否模糊) -> (修改时间, 图片)
+    每个渲染进程各有一份，背景文件修改后修改时间改变，旧的图片不再命中
+"""
+
+
+def blur_file(path: Path):
+    return path.with_name(f"{path.stem}_blur.png")
+
+
+def normalize(image: IMG):
+    """转为 RGB 并缩小到刚好覆盖 BG_SIZE"""
+    image = image.convert("RGB")
+    scale = max(BG_SIZE[0] / image.size[0], BG_SIZE[1] / image.size[1])
+    if scale < 1:
+        image = image.resize((round(image.size[0] * scale), round(image.size[1] * scale)), Image.Resampling.LANCZOS)
+    return image
+
+
+def preprocess(path: Path, data: bytes | None, blur: bool):
+    """
+    预处理背景
+        data:新上传的图片，为 None 时处理已有的背景
+        blur:同时保存高斯模糊后的背景，否则删除
+    """
+    if data is not None:
+        image = normalize(Image.open(BytesIO(data)))
+        image.save(path)
+    elif path.exists():
+        image = Image.open(path)
+    else:
+        return
+    if blur:
+        image.filter(ImageFilter.GaussianBlur(BLUR_RADIUS)).save(blur_file(path))
+    else:
+        blur_file(path).unlink(True)
+
+
+def forget(path: Path):
+    cache.pop((path, False), None)
+    cache.pop((path, True), None)
+
+
+def load(path: Path, blur: bool = False) -> IMG | None:
+    """读取背景，没有预处理过的背景在读取时缩小及模糊"""
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if (entry := cache.get((path, blur))) is not None and entry[0] == mtime:
+        return entry[1]
+    if not blur:
+        image = normalize(Image.open(path))
+    elif (file := blur_file(path)).exists() and file.stat().st_mtime_ns >= mtime:
+        image = Image.open(file).convert("RGB")
+    elif (image := load(path)) is not None:
+        image = image.filter(ImageFilter.GaussianBlur(BLUR_RADIUS))
+    cache.put((path, blur), (mtime, image))
+    return image
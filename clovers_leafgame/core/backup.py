@@ -0,0 +1,348 @@
+import os
+import json
+import zlib
+import mmap
+import struct
+import shutil
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from .data import User, Account, DataBase
+from . import snapshot
+
+FIELDS = ("user_dict", "group_dict", "account_dict")
+TIME_FORMAT = "%Y-%m-%d %H-%M-%S"
+BLOCK_USERS = 64
+"""每块的用户数"""
+MAGIC = b"LGBK"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+"""文件头：标识，版本"""
+FOOTER = struct.Struct("<Q")
+"""文件尾：索引的位置"""
+
+
+class Point(NamedTuple):
+    """备份时间点"""
+
+    time: datetime
+    kind: str
+    """base，delta，legacy（旧版每次完整备份的文件）"""
+    file: Path
+
+
+def digest(record: dict):
+    return zlib.crc32(json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode())
+
+
+def split(document: dict, owners: dict[str, str]):
+    """
+    按用户分块
+        每个用户与其账户为一块，群，extra 以及找不到用户的账户在公共块
+        owners:已删除的账户（记录为 None）所属的用户
+    """
+    blocks: dict[str, dict] = {}
+    for user_id, user in document.get("user_dict", {}).items():
+        blocks[user_id] = {"user_dict": {user_id: user}, "account_dict": {}}
+    common = {"group_dict": document.get("group_dict", {}), "account_dict": {}, "extra": document.get("extra", {})}
+    for account_id, account in document.get("account_dict", {}).items():
+        user_id = account["user_id"] if account else owners.get(account_id)
+        if user_id is None:
+            common["account_dict"][account_id] = account
+        else:
+            blocks.setdefault(user_id, {"user_dict": {}, "account_dict": {}})["account_dict"][account_id] = account
+    return blocks, common
+
+
+def merge(document: dict, block: dict):
+    """把块（或 delta 的块）合并到 document，记录为 None 时删除"""
+    for field in FIELDS:
+        records = document.setdefault(field, {})
+        for key, record in block.get(field, {}).items():
+            if record is None:
+                records.pop(key, None)
+            else:
+                records[key] = record
+    if "extra" in block:
+        document["extra"] = block["extra"]
+
+
+def write(file: Path, blocks: dict[str, dict], common: dict, base: str | None):
+    """
+    写入备份文件
+        文件头，公共块，用户块，索引，文件尾
+        每 BLOCK_USERS 个用户合为一块，每块单独 zlib 压缩，索引记录每块的 (位置, 长度) 及每个用户所在的块
+    """
+    tmp = file.with_suffix(".tmp")
+    index = {"base": base, "blocks": [], "users": {}}
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION))
+        offset = HEADER.size
+
+        def put(block: dict):
+            nonlocal offset
+            data = zlib.compress(json.dumps(block, ensure_ascii=False, separators=(",", ":")).encode())
+            f.write(data)
+            span = (offset, len(data))
+            offset += len(data)
+            return span
+
+        index["common"] = put(common)
+        user_ids = list(blocks)
+        for i in range(0, len(user_ids), BLOCK_USERS):
+            chunk = user_ids[i : i + BLOCK_USERS]
+            n = len(index["blocks"])
+            index["blocks"].append(put({user_id: blocks[user_id] for user_id in chunk}))
+            index["users"].update((user_id, n) for user_id in chunk)
+        f.write(zlib.compress(json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode()))
+        f.write(FOOTER.pack(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(file)
+
+
+class BackupFile:
+    """按索引读取备份文件中的块"""
+
+    def __init__(self, file: Path) -> None:
+        with open(file, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不支持的备份文件：{file}")
+        (offset,) = FOOTER.unpack_from(self.buffer, len(self.buffer) - FOOTER.size)
+        self.index = json.loads(zlib.decompress(self.buffer[offset : len(self.buffer) - FOOTER.size]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.buffer.close()
+
+    def read(self, span: tuple[int, int]) -> dict:
+        offset, length = span
+        return json.loads(zlib.decompress(self.buffer[offset : offset + length]))
+
+    def user(self, user_id: str) -> dict:
+        """只读取并解压用户所在的块"""
+        n = self.index["users"].get(user_id)
+        if n is None:
+            return {}
+        return self.read(self.index["blocks"][n])[user_id]
+
+    def blocks(self):
+        yield self.read(self.index["common"])
+        for span in self.index["blocks"]:
+            yield from self.read(span).values()
+
+
+class BackupStore:
+    """
+    备份
+        backup/points/{时间}.base:完整备份
+        backup/points/{时间}.delta:与所属 base 不同的记录，已删除的记录为 null
+    每 base_interval 次备份（或 delta 超过 base 的一半）保存一次 base，其余保存 delta。
+    delta 总是相对 base 而不是上一次备份，恢复任意时间点只需要读取一个 base 和一个 delta。
+    文件按用户分块压缩并带有索引，恢复单个用户时只读取该用户的块。
+    """
+
+    def __init__(self, path: Path, base_interval: int = 6, retention: tuple[int, int, int] = (24, 7, 4)) -> None:
+        self.path = path
+        self.points_path = path / "points"
+        self.points_path.mkdir(exist_ok=True, parents=True)
+        self.base_interval = base_interval
+        self.retention = retention
+        """保留最近多少小时每小时一份，多少天每天一份，多少周每周一份"""
+        self.base: Point | None = None
+        self.hashes: dict[str, dict[str, int]] | None = None
+        """base 中每条记录的 crc32"""
+        self.owners: dict[str, str] = {}
+        """base 中每个账户所属的用户"""
+        self.count = 0
+        """base 之后的 delta 数"""
+        self.lock = threading.Lock()
+        self.cache: list[Point] | None = None
+        """备份时间点缓存，写入或删除备份时失效"""
+
+    def file(self, time: datetime, kind: str):
+        return self.points_path / f"{time.strftime(TIME_FORMAT)}.{kind}"
+
+    def legacy_points(self):
+        for folder in self.path.iterdir():
+            if not folder.is_dir() or folder == self.points_path:
+                continue
+            for file in folder.iterdir():
+                if file.suffix not in {".json", ".snap"}:
+                    continue
+                try:
+                    time = datetime.strptime(f"{folder.name} {file.stem.split()[1]}", TIME_FORMAT)
+                except (ValueError, IndexError):
+                    continue
+                yield Point(time, "legacy", file)
+
+    def points(self):
+        """全部备份时间点，按时间排序"""
+        if self.cache is not None:
+            return self.cache
+        points = list(self.legacy_points())
+        for file in self.points_path.iterdir():
+            if file.suffix not in {".base", ".delta"}:
+                continue
+            try:
+                time = datetime.strptime(file.stem, TIME_FORMAT)
+            except ValueError:
+                continue
+            points.append(Point(time, file.suffix[1:], file))
+        points.sort(key=lambda point: point.time)
+        self.cache = points
+        return points
+
+    def set_base(self, point: Point, document: dict):
+        self.base = point
+        self.hashes = {field: {key: digest(record) for key, record in document.get(field, {}).items()} for field in FIELDS}
+        self.owners = {key: account["user_id"] for key, account in document.get("account_dict", {}).items()}
+        self.count = 0
+
+    def locate_base(self):
+        """找到最近的 base 并计算记录的 crc32"""
+        points = [point for point in self.points() if point.kind != "legacy"]
+        bases = [i for i, point in enumerate(points) if point.kind == "base"]
+        if not bases:
+            return
+        i = bases[-1]
+        self.set_base(points[i], self.document(points[i]))
+        self.count = len(points) - i - 1
+
+    def write(self, document: dict, time: datetime):
+        """保存一次备份，在线程中执行"""
+        with self.lock:
+            try:
+                self.write_point(document, time)
+            finally:
+                self.cache = None
+
+    def write_point(self, document: dict, time: datetime):
+        if self.hashes is None:
+            self.locate_base()
+        if self.base and self.hashes is not None and self.count + 1 < self.base_interval:
+            delta = {}
+            changed = 0
+            for field in FIELDS:
+                hashes = self.hashes[field]
+                records = document.get(field, {})
+                diff = {key: record for key, record in records.items() if hashes.get(key) != digest(record)}
+                diff.update((key, None) for key in hashes.keys() - records.keys())
+                delta[field] = diff
+                changed += len(diff)
+            if changed * 2 <= sum(map(len, self.hashes.values())):
+                delta["extra"] = document.get("extra", {})
+                write(self.file(time, "delta"), *split(delta, self.owners), self.base.file.name)
+                self.count += 1
+                return
+        file = self.file(time, "base")
+        write(file, *split(document, {}), None)
+        self.set_base(Point(time, "base", file), document)
+
+    def document(self, point: Point):
+        """读取时间点的完整数据"""
+        document = {field: {} for field in FIELDS}
+        with BackupFile(point.file) as f:
+            base = f.index["base"]
+            if base is not None:
+                with BackupFile(self.points_path / base) as base_file:
+                    for block in base_file.blocks():
+                        merge(document, block)
+            for block in f.blocks():
+                merge(document, block)
+        return document
+
+    def load(self, point: Point):
+        if point.kind == "legacy":
+            return snapshot.load(point.file)
+        return DataBase.model_validate(self.document(point))
+
+    def materialize(self, time: datetime):
+        """恢复 time 时（之前最近一次备份）的数据"""
+        points = [point for point in self.points() if point.time <= time]
+        if not points:
+            return None
+        return self.load(points[-1])
+
+    def load_user(self, point: Point, user_id: str) -> tuple[User | None, list[Account]]:
+        """只读取一个用户及其账户"""
+        if point.kind == "legacy":
+            data = snapshot.load(point.file)
+            user = data.user_dict.get(user_id)
+            if not user:
+                return None, []
+            return user, [account for account_id in user.accounts_map.values() if (account := data.account_dict.get(account_id))]
+        document = {field: {} for field in FIELDS}
+        with BackupFile(point.file) as f:
+            block = f.user(user_id)
+            base = f.index["base"]
+        if base is not None:
+            with BackupFile(self.points_path / base) as f:
+                merge(document, f.user(user_id))
+        merge(document, block)
+        user = document["user_dict"].get(user_id)
+        if not user:
+            return None, []
+        accounts = [Account.model_validate(account) for account in document["account_dict"].values()]
+        return User.model_validate(user), accounts
+
+    def keep(self, points: list[Point], now: datetime):
+        """按保留策略选出要保留的时间点"""
+        hourly, daily, weekly = self.retention
+        tiers = (
+            (timedelta(hours=hourly), lambda t: (t.date(), t.hour)),
+            (timedelta(days=daily), lambda t: t.date()),
+            (timedelta(weeks=weekly), lambda t: t.isocalendar()[:2]),
+        )
+        keep = {points[-1].file} if points else set()
+        for span, bucket in tiers:
+            buckets = {}
+            for point in points:
+                if now - point.time <= span:
+                    buckets[bucket(point.time)] = point
+            keep.update(point.file for point in buckets.values())
+        return keep
+
+    def prune(self, now: datetime | None = None):
+        """
+        按保留策略删除备份
+            保留的 delta 所属的 base（它之前最近的 base）也会保留
+            return:删除的文件
+        """
+        now = now or datetime.now()
+        with self.lock:
+            points = [point for point in self.points() if point.kind != "legacy"]
+            keep = self.keep(points, now)
+            base = None
+            for point in points:
+                if point.kind == "base":
+                    base = point
+                elif point.file in keep and base:
+                    keep.add(base.file)
+            if self.base:
+                keep.add(self.base.file)
+            removed = []
+            for point in points:
+                if point.file not in keep:
+                    point.file.unlink(True)
+                    removed.append(point.file.name)
+            self.cache = None
+            return removed
+
+    def clean_legacy(self, delta: int | float):
+        """删除早于 delta 秒的旧版备份文件夹"""
+        removed = []
+        for folder in self.path.iterdir():
+            if not folder.is_dir() or folder == self.points_path:
+                continue
+            if datetime.now().timestamp() - folder.stat().st_mtime > delta:
+                shutil.rmtree(folder, ignore_errors=True)
+                removed.append(folder.name)
+        if removed:
+            self.cache = None
+        return removed
@@ -1,16 +1,188 @@
 from datetime import datetime
 from pathlib import Path
-from pydantic import BaseModel
-from collections import Counter
+from functools import partial
+from array import array
+from typing import Any
+from collections.abc import Callable, Mapping, MutableMapping
+from pydantic import BaseModel, PrivateAttr, GetCoreSchemaHandler
+from pydantic_core import core_schema
 
 KeyMap = dict[str, str]
 
 
+KEYS: list[str] = []
+"""库存 key 的全局编号表"""
+SLOTS: dict[str, int] = {}
+INT64 = 1 << 63
+
+
+def slot(key: str):
+    """key 的全局编号，不存在时新建"""
+    i = SLOTS.get(key)
+    if i is None:
+        i = SLOTS[key] = len(KEYS)
+        KEYS.append(key)
+    return i
+
+
+class Bank(MutableMapping[str, int]):
+    """
+    库存
+        pairs 依次保存 key 的全局编号和数量：[编号, 数量, 编号, 数量...]，数量为 0 的 key 不保存，空库存不创建数组。
+        超出 int64 的数量保存在 big 中。
+        行为与 Counter 相同：不存在的 key 为 0，update 和 += 为相加。
+        写入后以 (owner, key, 变化量) 调用 hook，用于标记所属的记录已修改
+    """
+
+    __slots__ = ("pairs", "big", "hook", "owner")
+
+    def __init__(self, data: Mapping[str, int] | None = None):
+        self.pairs: array | None = None
+        self.big: dict[int, int] | None = None
+        self.hook: Callable[[Any, str, int], None] | None = None
+        self.owner = None
+        if data:
+            for key, n in data.items():
+                self.store(slot(key), n)
+
+    def locate(self, i: int):
+        """编号在 pairs 中的位置，不存在时为 -1"""
+        pairs = self.pairs
+        if pairs is None:
+            return -1
+        start = 0
+        try:
+            while (p := pairs.index(i, start)) & 1:
+                start = p + 1
+        except ValueError:
+            return -1
+        return p
+
+    def load(self, i: int):
+        if (p := self.locate(i)) >= 0:
+            return self.pairs[p + 1]
+        if self.big:
+            return self.big.get(i, 0)
+        return 0
+
+    def store(self, i: int, n: int):
+        p = self.locate(i)
+        if p >= 0:
+            if n and -INT64 <= n < INT64:
+                self.pairs[p + 1] = n
+                return
+            del self.pairs[p : p + 2]
+            if not self.pairs:
+                self.pairs = None
+        elif self.big and i in self.big:
+            del self.big[i]
+        if not n:
+            return
+        if -INT64 <= n < INT64:
+            if self.pairs is None:
+                self.pairs = array("q", (i, n))
+            else:
+                self.pairs.extend((i, n))
+        else:
+            if self.big is None:
+                self.big = {}
+            self.big[i] = n
+
+    def __getitem__(self, key: str) -> int:
+        i = SLOTS.get(key)
+        return 0 if i is None else self.load(i)
+
+    def __setitem__(self, key: str, value: int):
+        i = slot(key)
+        delta = value - self.load(i)
+        self.store(i, value)
+        if self.hook:
+            self.hook(self.owner, key, delta)
+
+    def __delitem__(self, key: str):
+        i = SLOTS.get(key)
+        if i is None or not (n := self.load(i)):
+            return
+        self.store(i, 0)
+        if self.hook:
+            self.hook(self.owner, key, -n)
+
+    def __contains__(self, key):
+        i = SLOTS.get(key)
+        return i is not None and self.load(i) != 0
+
+    def __iter__(self):
+        keys = [KEYS[i] for i in self.pairs[::2]] if self.pairs else []
+        if self.big:
+            keys.extend(KEYS[i] for i in self.big)
+        return iter(keys)
+
+    def __len__(self):
+        return (len(self.pairs) // 2 if self.pairs else 0) + (len(self.big) if self.big else 0)
+
+    def to_dict(self) -> dict[str, int]:
+        pairs = self.pairs
+        result = dict(zip(map(KEYS.__getitem__, pairs[::2]), pairs[1::2])) if pairs else {}
+        if self.big:
+            result.update((KEYS[i], n) for i, n in self.big.items())
+        return result
+
+    def items(self):
+        return self.to_dict().items()
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self else default
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def replace(self, data: Mapping[str, int]):
+        """整体替换库存内容，每个变化的 key 都经过 hook"""
+        for key in list(self):
+            if key not in data:
+                del self[key]
+        for key, n in data.items():
+            if self[key] != n:
+                self[key] = n
+
+    def update(self, other: Mapping[str, int] | None = None, /, **kwargs: int):
+        """与 Counter.update 相同：数量相加"""
+        for data in (other or {}, kwargs):
+            for key, n in data.items():
+                self[key] = self[key] + n
+
+    def __iadd__(self, other: Mapping[str, int]):
+        """与 Counter 相同：相加后去掉不为正的 key"""
+        self.update(other)
+        for key, n in list(self.items()):
+            if n <= 0:
+                del self[key]
+        return self
+
+    def copy(self):
+        return Bank(self)
+
+    def __reduce__(self):
+        return Bank, (self.to_dict(),)
+
+    def __repr__(self):
+        return f"Bank({self.to_dict()!r})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source, handler: GetCoreSchemaHandler):
+        return core_schema.no_info_after_validator_function(
+            cls,
+            handler(dict[str, int]),
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.to_dict),
+        )
+
+
 class Item(BaseModel):
     id: str
     name: str
 
-    def deal(self, bank: Counter[str], unsettled: int):
+    def deal(self, bank: MutableMapping[str, int], unsettled: int):
         prop_id = self.id
         n = bank[prop_id]
         if unsettled < 0 and n < (-unsettled):
@@ -23,8 +195,8 @@ class User(BaseModel):
     name: str = ""
     avatar_url: str = ""
     connect: str = ""
-    bank: Counter[str] = Counter()
-    invest: Counter[str] = Counter()
+    bank: Bank = Bank()
+    invest: Bank = Bank()
     extra: dict = {}
     accounts_map: KeyMap = {}
     """Find account ID from group_id"""
@@ -40,7 +212,7 @@ class Account(BaseModel):
     group_id: str
     name: str = ""
     sign_in: datetime | None = None
-    bank: Counter[str] = Counter()
+    bank: Bank = Bank()
     extra: dict = {}
 
     @property
@@ -95,7 +267,9 @@ class Stock(Item):
     time: float
     """注册时间"""
     exchange: dict[str, tuple[int, float]] = {}
-    """交易信息"""
+    """交易信息（卖单）：user_id -> (数量, 报价)"""
+    bids: dict[str, tuple[int, float, int]] = {}
+    """买单：user_id -> (数量, 单价, 冻结的标准金币)"""
 
 
 class Group(BaseModel):
@@ -104,8 +278,8 @@ class Group(BaseModel):
     avatar_url: str | None = None
     level: int = 1
     stock: Stock | None = None
-    bank: Counter[str] = Counter()
-    invest: Counter[str] = Counter()
+    bank: Bank = Bank()
+    invest: Bank = Bank()
     extra: dict = {}
     accounts_map: KeyMap = {}
     """Find account ID from user_id"""
@@ -116,11 +290,59 @@ class Group(BaseModel):
         return self.stock.name if self.stock else self.name or self.id
 
 
+class ShardDict[V](dict[str, V]):
+    """
+    按需加载的字典
+        查找不存在的 key 时先调用 locate 加载 key 所在的分片
+        遍历只包含已加载的记录，需要全部记录时先调用 load_all
+    """
+
+    def __init__(self, data: dict[str, V], locate: Callable[[str], bool], load_all: Callable[[], None]):
+        super().__init__(data)
+        self.locate = locate
+        self.load_all = load_all
+
+    def __missing__(self, key: str):
+        if self.locate(key) and dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self.locate(key) and dict.__contains__(self, key))
+
+    def get(self, key: str, default=None):
+        if not dict.__contains__(self, key):
+            self.locate(key)
+        return dict.get(self, key, default)
+
+
+type Listener = Callable[[str, str, User | Group | Account, str, int], None]
+"""库存变化的订阅者：(字段名, 库存名, 记录, key, 变化量)"""
+
+
 class DataBase(BaseModel):
     user_dict: dict[str, User] = {}
     group_dict: dict[str, Group] = {}
     account_dict: dict[str, Account] = {}
     extra: dict = {}
+    _dirty: dict[str, set[str]] = PrivateAttr(default_factory=lambda: {"user_dict": set(), "group_dict": set(), "account_dict": set()})
+    """修改过的记录，按字段名分组"""
+    _outdated: bool = PrivateAttr(default=False)
+    """需要完整保存"""
+    _journal = PrivateAttr(default=None)
+    """库存修改日志"""
+    _hooks: dict[tuple[str, str], Callable] = PrivateAttr(default_factory=dict)
+    """按 (字段名, 库存名) 共用的库存钩子"""
+    _listeners: list[Listener] = PrivateAttr(default_factory=list)
+    """库存变化的订阅者"""
+
+    def model_post_init(self, __context):
+        self._hooks = {
+            (field, bank): partial(self.on_change, field, bank)
+            for field in ("user_dict", "group_dict", "account_dict")
+            for bank in ("bank", "invest")
+        }
+        self.bind_all()
 
     @classmethod
     def load(cls, file: Path):
@@ -131,25 +353,183 @@ class DataBase(BaseModel):
             data = cls()
         return data
 
+    @staticmethod
+    def field(record: User | Group | Account):
+        match record:
+            case User():
+                return "user_dict"
+            case Group():
+                return "group_dict"
+            case Account():
+                return "account_dict"
+        raise TypeError(record)
+
+    def bind(self, record: User | Group | Account):
+        """让记录的库存在写入时标记该记录"""
+        field = self.field(record)
+        record.bank.hook = self._hooks[field, "bank"]
+        record.bank.owner = record
+        if not isinstance(record, Account):
+            record.invest.hook = self._hooks[field, "invest"]
+            record.invest.owner = record
+
+    def on_change(self, field: str, bank: str, record: User | Group | Account, key: str, delta: int):
+        self._dirty[field].add(record.id)
+        if self._journal:
+            self._journal.write(field, record, bank, key, delta)
+        for listener in self._listeners:
+            listener(field, bank, record, key, delta)
+
+    def set_journal(self, journal):
+        self._journal = journal
+
+    def set_listeners(self, listeners: list[Listener]):
+        self._listeners = listeners
+
+    def subscribe(self, listener: Listener):
+        """
+        订阅库存变化
+            listener(字段名, 库存名, 记录, key, 变化量)，在修改完成后调用
+            记录注册或注销时，其库存的全部数量也会作为变化量通知
+            另有两种非库存的通知：
+                ("group_dict", "level", 群, 群id, 等级变化量):群等级修改
+                (字段名, "record", 记录, 记录id, ±1):记录注册（写入）或注销
+            分片存档加载或移出分片时不通知，见 ShardStorage
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener):
+        self._listeners.remove(listener)
+
+    def emit(self, record: User | Group | Account, sign: int):
+        """
+        通知订阅者记录的新增或移除
+            全部库存作为变化量，以及一条 record 通知。sign 为 1 时是新增，-1 时是移除
+        """
+        if not self._listeners:
+            return
+        field = self.field(record)
+        banks = ("bank",) if isinstance(record, Account) else ("bank", "invest")
+        for bank in banks:
+            for key, n in getattr(record, bank).items():
+                for listener in self._listeners:
+                    listener(field, bank, record, key, sign * n)
+        for listener in self._listeners:
+            listener(field, "record", record, record.id, sign)
+
+    def set_level(self, group: Group, level: int):
+        """修改群等级"""
+        delta = level - group.level
+        group.level = level
+        self._dirty["group_dict"].add(group.id)
+        if delta:
+            for listener in self._listeners:
+                listener("group_dict", "level", group, group.id, delta)
+
+    def touch_stock(self, group: Group):
+        """股票（价格，发行量，买卖单）修改后调用：标记群已修改并把股票写入日志"""
+        self._dirty["group_dict"].add(group.id)
+        if self._journal:
+            self._journal.stock(group)
+
+    def bind_all(self):
+        for records in (self.user_dict, self.group_dict, self.account_dict):
+            for record in records.values():
+                self.bind(record)
+
+    def load_all(self):
+        """批量操作前调用：加载全部分片"""
+        for records in (self.group_dict, self.account_dict):
+            if isinstance(records, ShardDict):
+                records.load_all()
+
+    def touch(self, record: User | Group | Account):
+        """标记记录已修改"""
+        self._dirty[self.field(record)].add(record.id)
+
+    def touch_all(self):
+        """批量修改后调用：重新绑定所有记录，下次保存为完整保存"""
+        self.bind_all()
+        self._outdated = True
+
+    @property
+    def outdated(self):
+        return self._outdated
+
+    def pop_dirty(self) -> dict[str, dict[str, User | Group | Account | None]]:
+        """
+        取出修改过的记录并清空标记
+            已删除的记录为 None
+        """
+        dirty = {}
+        for field, keys in self._dirty.items():
+            if not keys:
+                continue
+            records = getattr(self, field)
+            dirty[field] = {key: records.get(key) for key in keys}
+            keys.clear()
+        return dirty
+
+    def apply_delta(self, delta: dict):
+        """在当前数据上应用一行增量记录"""
+        for field, model in (("user_dict", User), ("group_dict", Group), ("account_dict", Account)):
+            records = getattr(self, field)
+            for key, record in delta.get(field, {}).items():
+                if record is None:
+                    records.pop(key, None)
+                else:
+                    record = records[key] = model.model_validate(record)
+                    self.bind(record)
+        if "extra" in delta:
+            self.extra = delta["extra"]
+
+    def clean(self):
+        """完整保存后清空修改标记"""
+        for keys in self._dirty.values():
+            keys.clear()
+        self._outdated = False
+
     def register(self, account: Account):
         """注册个人账户"""
         user_id = account.user_id
         group_id = account.group_id
         account_id = account.id
-        self.user(user_id).accounts_map[group_id] = account_id
-        self.group(group_id).accounts_map[user_id] = account_id
+        user = self.user(user_id)
+        user.accounts_map[group_id] = account_id
+        self.touch(user)
+        group = self.group(group_id)
+        group.accounts_map[user_id] = account_id
+        self.touch(group)
+        if old := self.account_dict.get(account_id):
+            self.emit(old, -1)
         self.account_dict[account_id] = account
+        self.bind(account)
+        self.touch(account)
+        self.emit(account, 1)
+
+    def set_user(self, user: User):
+        """写入 user"""
+        if old := self.user_dict.get(user.id):
+            self.emit(old, -1)
+        self.user_dict[user.id] = user
+        self.bind(user)
+        self.touch(user)
+        self.emit(user, 1)
 
     def user(self, user_id: str):
+        """查找 user，不存在时新建。只有新建时标记已修改，修改库存以外的字段后须调用 touch"""
         if user_id not in self.user_dict:
-            self.user_dict[user_id] = User(id=user_id)
-
+            user = self.user_dict[user_id] = User(id=user_id)
+            self.bind(user)
+            self._dirty["user_dict"].add(user_id)
         return self.user_dict[user_id]
 
     def group(self, group_id: str):
+        """查找 group，不存在时新建。只有新建时标记已修改，修改库存以外的字段后须调用 touch"""
         if group_id not in self.group_dict:
-            self.group_dict[group_id] = Group(id=group_id)
-
+            group = self.group_dict[group_id] = Group(id=group_id)
+            self.bind(group)
+            self._dirty["group_dict"].add(group_id)
         return self.group_dict[group_id]
 
     def cancel_account(self, account_id: str):
@@ -160,6 +540,12 @@ class DataBase(BaseModel):
         user_id = account.user_id
         group_id = account.group_id
         del self.account_dict[account_id]
+        if self._journal:
+            self._journal.cancel("account_dict", account_id)
+        self.emit(account, -1)
+        self._dirty["account_dict"].add(account_id)
+        self._dirty["user_dict"].add(user_id)
+        self._dirty["group_dict"].add(group_id)
         try:
             del self.user_dict[user_id].accounts_map[group_id]
         except Exception as e:
@@ -175,9 +561,15 @@ class DataBase(BaseModel):
         if not user:
             return
         del self.user_dict[user_id]
+        if self._journal:
+            self._journal.cancel("user_dict", user_id)
+        self.emit(user, -1)
+        self._dirty["user_dict"].add(user_id)
         for group_id, account_id in user.accounts_map.items():
+            self._dirty["account_dict"].add(account_id)
+            self._dirty["group_dict"].add(group_id)
             try:
-                del self.account_dict[account_id]
+                self.emit(self.account_dict.pop(account_id), -1)
             except Exception as e:
                 print(e)
             try:
@@ -191,9 +583,15 @@ class DataBase(BaseModel):
         del self.group_dict[group_id]
         if not group:
             return
+        if self._journal:
+            self._journal.cancel("group_dict", group_id)
+        self.emit(group, -1)
+        self._dirty["group_dict"].add(group_id)
         for user_id, account_id in group.accounts_map.items():
+            self._dirty["account_dict"].add(account_id)
+            self._dirty["user_dict"].add(user_id)
             try:
-                del self.account_dict[account_id]
+                self.emit(self.account_dict.pop(account_id), -1)
             except Exception as e:
                 print(e)
             try:
@@ -0,0 +1,207 @@
+import os
+import struct
+import zlib
+import asyncio
+from pathlib import Path
+from .data import User, Group, Account, Stock, DataBase
+
+HEADER = struct.Struct("<4sQ")
+"""文件头：标识，世代"""
+MAGIC = b"LGJ1"
+FRAME = struct.Struct("<II")
+"""记录头：长度，crc32"""
+ENTRY = struct.Struct("<BBB")
+"""操作，类型，字段"""
+STRING = struct.Struct("<H")
+BLOB = struct.Struct("<I")
+DELTA = struct.Struct("<q")
+INT64 = 1 << 63
+SYNC_DELAY = 1.0
+"""写入后最多等待多少秒同步到磁盘"""
+
+OP_DELTA = 0
+OP_CANCEL = 1
+OP_STOCK = 2
+KINDS = ("user_dict", "group_dict", "account_dict")
+FIELDS = ("bank", "invest")
+BIG_DELTA = 0x80
+"""字段标记：变化量超出 int64，以字符串保存"""
+
+
+def pack_str(s: str):
+    data = s.encode()
+    return STRING.pack(len(data)) + data
+
+
+def unpack_str(buffer: bytes, offset: int):
+    (l,) = STRING.unpack_from(buffer, offset)
+    offset += STRING.size
+    return buffer[offset : offset + l].decode(), offset + l
+
+
+class Journal:
+    """
+    库存修改日志
+        每次库存写入追加一条二进制记录，启动时在存档上重放。
+        股票修改（价格，发行量，买卖单）后追加整个 Stock，重放时替换群的股票。
+        每次保存开始时世代 +1 并换用新的日志文件，世代记录在 DataBase.extra["journal"]。
+        存档写入完成后删除更早世代的日志，重放时只使用世代不小于存档世代的日志。
+    持久性：日志文件无缓冲，每条记录立即交给操作系统，进程崩溃不会丢失记录；
+        第一条未同步的记录写入后 SYNC_DELAY 秒内 fsync（没有运行中的事件循环时在关闭时），断电最多丢失这段时间内的记录
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.generation = 0
+        self.count = 0
+        self.f = None
+        self.sync_pending = False
+
+    def files(self):
+        files = ((f, int(f.stem)) for f in self.path.glob("*.journal") if f.stem.isdigit())
+        return sorted(files, key=lambda x: x[1])
+
+    @staticmethod
+    def owner(record: User | Group | Account):
+        if isinstance(record, Account):
+            return record.user_id, record.group_id
+        return record.id, ""
+
+    def append(self, payload: bytes):
+        if not self.f:
+            return
+        self.f.write(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.count += 1
+        if self.sync_pending:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.sync_pending = True
+        loop.call_later(SYNC_DELAY, self.sync)
+
+    def sync(self):
+        """把已写入的记录同步到磁盘"""
+        self.sync_pending = False
+        if self.f:
+            os.fsync(self.f.fileno())
+
+    def write(self, kind: str, record: User | Group | Account, field: str, key: str, delta: int):
+        a, b = self.owner(record)
+        flag = FIELDS.index(field)
+        if -INT64 <= delta < INT64:
+            tail = DELTA.pack(delta)
+        else:
+            flag |= BIG_DELTA
+            tail = pack_str(str(delta))
+        self.append(ENTRY.pack(OP_DELTA, KINDS.index(kind), flag) + pack_str(a) + pack_str(b) + pack_str(key) + tail)
+
+    def cancel(self, kind: str, key: str):
+        self.append(ENTRY.pack(OP_CANCEL, KINDS.index(kind), 0) + pack_str(key))
+
+    def stock(self, group: Group):
+        blob = group.stock.model_dump_json().encode() if group.stock else b""
+        self.append(ENTRY.pack(OP_STOCK, KINDS.index("group_dict"), 0) + pack_str(group.id) + BLOB.pack(len(blob)) + blob)
+
+    @staticmethod
+    def entries(file: Path):
+        """读取日志，末尾不完整或校验失败的记录会被忽略"""
+        buffer = file.read_bytes()
+        if len(buffer) < HEADER.size:
+            return 0, []
+        magic, generation = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            return 0, []
+        entries = []
+        offset = HEADER.size
+        while offset + FRAME.size <= len(buffer):
+            length, crc = FRAME.unpack_from(buffer, offset)
+            offset += FRAME.size
+            payload = buffer[offset : offset + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            offset += length
+            op, kind, flag = ENTRY.unpack_from(payload)
+            kind = KINDS[kind]
+            i = ENTRY.size
+            if op == OP_CANCEL:
+                key, i = unpack_str(payload, i)
+                entries.append((op, kind, key))
+                continue
+            if op == OP_STOCK:
+                key, i = unpack_str(payload, i)
+                (l,) = BLOB.unpack_from(payload, i)
+                i += BLOB.size
+                entries.append((op, kind, key, payload[i : i + l]))
+                continue
+            a, i = unpack_str(payload, i)
+            b, i = unpack_str(payload, i)
+            key, i = unpack_str(payload, i)
+            if flag & BIG_DELTA:
+                delta = int(unpack_str(payload, i)[0])
+            else:
+                (delta,) = DELTA.unpack_from(payload, i)
+            entries.append((op, kind, (a, b), FIELDS[flag & ~BIG_DELTA], key, delta))
+        return generation, entries
+
+    def replay(self, data: DataBase):
+        """在存档上重放日志，返回重放的记录数"""
+        entries = []
+        for file, generation in self.files():
+            if generation >= data.extra.get("journal", 0):
+                entries += self.entries(file)[1]
+        for op, kind, *args in entries:
+            if op == OP_CANCEL:
+                (key,) = args
+                match kind:
+                    case "user_dict":
+                        data.cancel_user(key)
+                    case "group_dict":
+                        if key in data.group_dict:
+                            data.cancel_group(key)
+                    case "account_dict":
+                        data.cancel_account(key)
+                continue
+            if op == OP_STOCK:
+                key, blob = args
+                group = data.group(key)
+                group.stock = Stock.model_validate_json(blob) if blob else None
+                data.touch(group)
+                continue
+            (a, b), field, key, delta = args
+            match kind:
+                case "user_dict":
+                    record = data.user(a)
+                case "group_dict":
+                    record = data.group(a)
+                case _:
+                    user = data.user(a)
+                    account_id = user.accounts_map.get(b)
+                    if not (account_id and (record := data.account_dict.get(account_id))):
+                        record = Account(user_id=a, group_id=b)
+                        data.register(record)
+            getattr(record, field)[key] += delta
+        return len(entries)
+
+    def open(self, generation: int):
+        """开始记录新世代"""
+        self.close()
+        self.generation = generation
+        self.count = 0
+        file = self.path / f"{generation}.journal"
+        file.write_bytes(HEADER.pack(MAGIC, generation))
+        self.f = open(file, "ab", buffering=0)
+
+    def clean(self, generation: int):
+        """删除早于 generation 的日志"""
+        for file, n in self.files():
+            if n < generation:
+                file.unlink(True)
+
+    def close(self):
+        if self.f:
+            os.fsync(self.f.fileno())
+            self.f.close()
+            self.f = None
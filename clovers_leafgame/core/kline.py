@@ -0,0 +1,44 @@
+import time
+
+RESOLUTIONS = {
+    "1h": (3600, 0, "%H:%M"),
+    "12h": (43200, 0, "%m-%d %H:%M"),
+    "7d": (604800, 3 * 86400, "%Y-%m-%d"),
+}
+"""K线周期：(秒数, 对齐偏移, 时间格式)，7d 从周一开始"""
+LENGTH = 60
+"""每个周期保留的K线数量"""
+
+type Bar = list[float]
+"""[开始时间, 开盘, 最高, 最低, 收盘]"""
+
+
+def bucket(t: float, resolution: str):
+    """t 所在K线的开始时间（按本地时间对齐）"""
+    period, offset, _ = RESOLUTIONS[resolution]
+    local = t - time.timezone + offset
+    return local - local % period + time.timezone - offset
+
+
+def update(ohlc: dict[str, list[Bar]], t: float, price: float):
+    """记录一次报价，更新各周期的最后一根K线或新开一根"""
+    for resolution in RESOLUTIONS:
+        bars = ohlc.setdefault(resolution, [])
+        start = bucket(t, resolution)
+        if bars and bars[-1][0] == start:
+            bar = bars[-1]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+        else:
+            bars.append([start, price, price, price, price])
+            del bars[:-LENGTH]
+
+
+def build(record: list[tuple[float, float]]):
+    """由价格历史生成各周期的K线"""
+    ohlc: dict[str, list[Bar]] = {}
+    for t, price in record:
+        if t:
+            update(ohlc, t, price)
+    return ohlc
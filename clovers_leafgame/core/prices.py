@@ -0,0 +1,160 @@
+import os
+import json
+import heapq
+import numpy as np
+from pathlib import Path
+from . import kline
+
+RAW = 720
+"""每只股票保留的报价数"""
+TIERS = tuple(kline.RESOLUTIONS)
+HEADER = 2 + 2 * len(TIERS)
+"""槽位头：报价及各周期K线环形缓冲的 (head, count)"""
+TIER_OFFSET = HEADER + RAW * 2
+RECORD = TIER_OFFSET + len(TIERS) * kline.LENGTH * 5
+"""每只股票的槽位长度（float64 个数）"""
+
+
+class PriceStore:
+    """
+    股价历史
+        所有股票共用一个 float64 内存映射文件 prices.bin，每只股票占一个固定长度的槽位：
+            [槽位头, 报价 (时间, 价格) × RAW, 各周期K线 (开始时间, 开盘, 最高, 最低, 收盘) × kline.LENGTH]
+        报价与K线都保存在环形缓冲中，写满后覆盖最早的一条。
+        股票 id -> 槽位编号保存在 index.json，新股票第一次记录报价时分配槽位（未写入 index.json 的槽位在重启后会被重新分配并清空），
+        删除的股票的槽位由之后的新股票重用，槽位不够时文件长度加倍。写入由操作系统同步到文件，保存游戏数据时 flush
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.file = path / "prices.bin"
+        self.index_file = path / "index.json"
+        self.index: dict[str, int] = json.loads(self.index_file.read_text()) if self.index_file.exists() else {}
+        self.index_version = 0
+        """index 每次修改加一"""
+        self.index_saved = 0
+        """已写入 index.json 的版本"""
+        self.mmap: np.memmap | None = None
+        self.array: np.ndarray
+        """mmap 的普通数组视图，避免 memmap 子类在每次索引时的开销"""
+        self.open(max(len(self.index), 16))
+        self.free = sorted(set(range(len(self.array))) - set(self.index.values()))
+        """空闲槽位（最小堆）"""
+
+    def open(self, capacity: int):
+        size = capacity * RECORD * 8
+        if not self.file.exists() or self.file.stat().st_size < size:
+            with open(self.file, "ab") as f:
+                f.truncate(size)
+        else:
+            capacity = self.file.stat().st_size // (RECORD * 8)
+        if self.mmap is not None:
+            self.mmap.flush()
+        self.mmap = np.memmap(self.file, np.float64, "r+", shape=(capacity, RECORD))
+        self.array = self.mmap.view(np.ndarray)
+
+    def snapshot(self):
+        """
+        在当前线程复制索引
+            return:把价格历史同步到磁盘的任务，可以在其他线程执行
+        """
+        mmap = self.mmap
+        version = self.index_version
+        index = dict(self.index) if version != self.index_saved else None
+
+        def task():
+            mmap.flush()
+            if index is None:
+                return
+            tmp = self.index_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(index))
+            os.replace(tmp, self.index_file)
+            self.index_saved = version
+
+        return task
+
+    def slot(self, stock_id: str, create: bool = False) -> np.ndarray | None:
+        if (i := self.index.get(stock_id)) is None:
+            if not create:
+                return None
+            if not self.free:
+                capacity = len(self.array)
+                self.open(capacity * 2)
+                self.free = list(range(capacity, len(self.array)))
+            i = self.index[stock_id] = heapq.heappop(self.free)
+            self.array[i] = 0
+            self.index_version += 1
+        return self.array[i]
+
+    def remove(self, stock_id: str):
+        """删除股票的价格历史，槽位在重新分配时清空"""
+        if (i := self.index.pop(stock_id, None)) is not None:
+            heapq.heappush(self.free, i)
+            self.index_version += 1
+
+    @staticmethod
+    def rings(record: np.ndarray):
+        """报价与各周期K线的环形缓冲，按槽位头的顺序"""
+        raw = record[HEADER:TIER_OFFSET].reshape(RAW, 2)
+        tiers = record[TIER_OFFSET:].reshape(len(TIERS), kline.LENGTH, 5)
+        return [raw, *tiers]
+
+    @staticmethod
+    def ordered(record: np.ndarray, k: int, ring: np.ndarray) -> np.ndarray:
+        """环形缓冲中的数据，从早到晚"""
+        head, count = int(record[2 * k]), int(record[2 * k + 1])
+        return np.roll(ring, -head, axis=0)[len(ring) - count :]
+
+    def record(self, stock_id: str, t: float, price: float):
+        """记录一次报价，更新各周期的最后一根K线或新开一根"""
+        record = self.slot(stock_id, True)
+        header = record[:HEADER].tolist()
+        head = int(header[0])
+        offset = HEADER + head * 2
+        record[offset : offset + 2] = (t, price)
+        record[0:2] = ((head + 1) % RAW, min(header[1] + 1, RAW))
+        for k, resolution in enumerate(TIERS, 1):
+            base = TIER_OFFSET + (k - 1) * kline.LENGTH * 5
+            head, count = int(header[2 * k]), header[2 * k + 1]
+            start = kline.bucket(t, resolution)
+            last = base + (head - 1) % kline.LENGTH * 5
+            if count and record[last] == start:
+                _, _, h, l, _ = record[last : last + 5].tolist()
+                record[last + 2 : last + 5] = (max(h, price), min(l, price), price)
+            else:
+                offset = base + head * 5
+                record[offset : offset + 5] = (start, price, price, price, price)
+                record[2 * k : 2 * k + 2] = ((head + 1) % kline.LENGTH, min(count + 1, kline.LENGTH))
+
+    def history(self, stock_id: str) -> np.ndarray:
+        """报价历史 [(时间, 价格)]，从早到晚"""
+        if (record := self.slot(stock_id)) is None:
+            return np.empty((0, 2))
+        return self.ordered(record, 0, self.rings(record)[0])
+
+    def ohlc(self, stock_id: str, resolution: str) -> list[kline.Bar]:
+        """某周期的K线，从早到晚"""
+        if (record := self.slot(stock_id)) is None:
+            return []
+        k = TIERS.index(resolution) + 1
+        return self.ordered(record, k, self.rings(record)[k]).tolist()
+
+    def adopt(self, stock_id: str, history: list[tuple[float, float]], ohlc: dict[str, list[kline.Bar]] | None = None):
+        """
+        导入旧版保存在群数据中的价格历史
+            history:[(时间, 价格)]，时间为 0 的是占位
+            ohlc:已有的K线，没有时由 history 生成
+        """
+        if stock_id in self.index:
+            return
+        history = [(t, price) for t, price in history if t][-RAW:]
+        ohlc = ohlc or kline.build(history)
+        record = self.slot(stock_id, True)
+        raw, *tiers = self.rings(record)
+        for k, (ring, rows) in enumerate(zip([raw, *tiers], [history, *(ohlc.get(resolution, []) for resolution in TIERS)])):
+            rows = rows[-len(ring) :]
+            if rows:
+                ring[: len(rows)] = rows
+            record[2 * k] = len(rows) % len(ring)
+            record[2 * k + 1] = len(rows)
@@ -0,0 +1,120 @@
+from bisect import bisect_left, insort
+from itertools import chain, islice
+
+LOAD = 256
+"""每段的目标长度，超过两倍时拆分"""
+
+
+class RankIndex:
+    """
+    排名索引
+        (-数量, key) 升序分段保存在 chunks 中，每段有序且段与段首尾相接，maxes 为每段的最大值
+        修改时二分查找所在的段，只移动段内的元素；各段长度的树状数组用于计算名次
+        数量为 0 的 key 不在索引中
+        version 在每次修改后 +1
+    """
+
+    def __init__(self) -> None:
+        self.values: dict[str, int] = {}
+        self.chunks: list[list[tuple[int, str]]] = []
+        self.maxes: list[tuple[int, str]] = []
+        self.tree: list[int] | None = None
+        """各段长度的树状数组，段拆分或删除后重建"""
+        self.version = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        """按名次遍历 (key, 数量)"""
+        return ((key, -value) for value, key in chain.from_iterable(self.chunks))
+
+    def __getitem__(self, key: str):
+        return self.values.get(key, 0)
+
+    def set(self, key: str, value: int):
+        old = self.values.get(key, 0)
+        if old == value:
+            return
+        self.version += 1
+        if old:
+            self.remove((-old, key))
+        if value:
+            self.values[key] = value
+            self.insert((-value, key))
+        else:
+            del self.values[key]
+
+    def update(self, key: str, delta: int):
+        self.set(key, self.values.get(key, 0) + delta)
+
+    def top(self, k: int):
+        """前 k 名：[(key, 数量)]"""
+        return list(islice(self, k))
+
+    def rank(self, key: str):
+        """名次，从 1 开始，不在索引中时为 None"""
+        value = self.values.get(key)
+        if not value:
+            return None
+        item = (-value, key)
+        i = bisect_left(self.maxes, item)
+        return self.prefix(i) + bisect_left(self.chunks[i], item) + 1
+
+    def insert(self, item: tuple[int, str]):
+        chunks, maxes = self.chunks, self.maxes
+        if not chunks:
+            chunks.append([item])
+            maxes.append(item)
+            self.tree = None
+            return
+        i = bisect_left(maxes, item)
+        if i == len(maxes):
+            i -= 1
+            chunks[i].append(item)
+            maxes[i] = item
+        else:
+            insort(chunks[i], item)
+        chunk = chunks[i]
+        if len(chunk) > 2 * LOAD:
+            chunks[i : i + 1] = [chunk[:LOAD], chunk[LOAD:]]
+            maxes[i : i + 1] = [chunk[LOAD - 1], chunk[-1]]
+            self.tree = None
+        else:
+            self.add(i, 1)
+
+    def remove(self, item: tuple[int, str]):
+        chunks, maxes = self.chunks, self.maxes
+        i = bisect_left(maxes, item)
+        chunk = chunks[i]
+        del chunk[bisect_left(chunk, item)]
+        if chunk:
+            maxes[i] = chunk[-1]
+            self.add(i, -1)
+        else:
+            del chunks[i]
+            del maxes[i]
+            self.tree = None
+
+    def add(self, i: int, delta: int):
+        """第 i 段的长度变化"""
+        if (tree := self.tree) is None:
+            return
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int):
+        """前 i 段的长度之和"""
+        if (tree := self.tree) is None:
+            n = len(self.chunks)
+            tree = self.tree = [0, *map(len, self.chunks)]
+            for j in range(1, n + 1):
+                if (k := j + (j & -j)) <= n:
+                    tree[k] += tree[j]
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
@@ -0,0 +1,208 @@
+import time
+import pickle
+import asyncio
+import importlib
+import multiprocessing
+from multiprocessing.context import SpawnContext, SpawnProcess
+from io import BytesIO
+from pathlib import Path
+from collections import Counter
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from PIL.Image import Image as IMG
+from clovers.core.config import config as clovers_config
+from clovers.utils.linecard import CropResize
+from .avatar import LRU
+from . import background
+
+
+class RenderCache:
+    """
+    渲染缓存
+        key 由 (卡片类型, 范围, 数据版本...) 组成，数据变化后版本改变，旧图片不再命中并按 LRU 淘汰
+        同一 key 的并发请求只渲染一次
+        ttl:图片最长保留时间（秒），用于昵称，头像等不计入版本的数据
+    """
+
+    def __init__(self, size: int = 64, ttl: float = 60) -> None:
+        self.ttl = ttl
+        self.images: LRU[Hashable, tuple[float, object]] = LRU(size)
+        self.pending: dict[Hashable, asyncio.Task] = {}
+        self.versions: Counter[str] = Counter()
+        """没有现成版本号的数据所用的版本"""
+
+    def version(self, scope: str):
+        return self.versions[scope]
+
+    def bump(self, scope: str):
+        self.versions[scope] += 1
+
+    async def get[T](self, key: Hashable, render: Callable[[], Awaitable[T]]) -> T:
+        cached = self.images.get(key)
+        if cached is not None and time.time() - cached[0] < self.ttl:
+            return cached[1]
+        if (task := self.pending.get(key)) is None:
+
+            async def run():
+                image = await render()
+                self.images.put(key, (time.time(), image))
+                return image
+
+            task = self.pending[key] = asyncio.create_task(run())
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+
+class Card:
+    """
+    绘图说明
+        在渲染进程中调用 func(*args, **kwargs)，参数中的 Card 会先被绘制
+        func 须为模块级函数，参数须可以 pickle
+    """
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func: Callable, *args, **kwargs) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __getstate__(self):
+        return self.func, self.args, self.kwargs
+
+    def __setstate__(self, state):
+        self.func, self.args, self.kwargs = state
+
+    def draw(self):
+        args = [x.draw() if isinstance(x, Card) else x for x in self.args]
+        kwargs = {k: v.draw() if isinstance(v, Card) else v for k, v in self.kwargs.items()}
+        return self.func(*args, **kwargs)
+
+
+def splice(info: list[IMG | Card | bytes], BG_path: Path, BG_type: str) -> bytes:
+    """
+    绘制并拼接资料卡，返回 PNG
+        info:图片，绘图说明或 PNG
+        BG_type:背景蒙版，GAUSS 为高斯模糊，NONE 为无，其他为颜色
+    """
+    images = []
+    for card in info:
+        if isinstance(card, Card):
+            card = card.draw()
+        elif isinstance(card, bytes):
+            card = Image.open(BytesIO(card))
+        if isinstance(card, list):
+            images.extend(card)
+        else:
+            images.append(card)
+    width, padding, spacing = 880, 20, 10
+    size = (width + padding * 2, sum(image.size[1] for image in images) + spacing * (2 * len(images) - 1) + padding * 2)
+    if (bg := background.load(BG_path)) is not None:
+        canvas = CropResize(bg, size)
+        if BG_type == "GAUSS":
+            blurred = CropResize(background.load(BG_path, True), size)
+    else:
+        canvas = Image.new("RGB", size, "white")
+        BG_type = "NONE"
+    y = padding
+    for image in images:
+        box = (padding, y, padding + width, y + image.size[1])
+        if BG_type == "GAUSS":
+            canvas.paste(blurred.crop(box), box)
+        elif BG_type != "NONE":
+            mask = Image.new("RGBA", (width, image.size[1]), BG_type)
+            canvas.paste(mask, box[:2], mask)
+        canvas.paste(image, box[:2], image)
+        y = box[3] + spacing * 2
+    output = BytesIO()
+    canvas.save(output, format="png")
+    return output.getvalue()
+
+
+RENDER_PROCESS = "LeafGameRender"
+"""渲染进程名的前缀"""
+
+
+def render_process():
+    """当前进程是否为渲染进程：渲染进程导入本插件时不加载插件与游戏数据，只使用绘图函数"""
+    return multiprocessing.current_process().name.startswith(RENDER_PROCESS)
+
+
+class RenderProcess(SpawnProcess):
+    """以 spawn 启动的渲染进程，进程名在导入本插件前即已设置"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.name = f"{RENDER_PROCESS}-{self.name}"
+
+
+class RenderContext(SpawnContext):
+    Process = RenderProcess
+
+
+def init_process(config: dict, module: str, name: str):
+    """
+    渲染进程的初始化
+        config:主进程的 clovers 配置
+        module, name:初始化函数，在设置配置后导入并调用
+    """
+    clovers_config.update(config)
+    getattr(importlib.import_module(module), name)()
+
+
+def call(payload: bytes):
+    func, args = pickle.loads(payload)
+    return func(*args)
+
+
+class Renderer:
+    """
+    渲染进程池
+        workers:渲染进程数，为 0 时在事件循环中直接绘制
+    渲染进程由 spawn 启动，不继承主进程的线程与游戏数据，启动时导入绘图函数所在的模块并执行初始化函数。
+    机器人的启动脚本会在渲染进程中以 __mp_main__ 导入，须有 if __name__ == "__main__" 保护。
+    进程池出错或参数不能 pickle 时在事件循环中绘制
+    """
+
+    def __init__(self, workers: int = 0) -> None:
+        self.workers = workers
+        self.executor: ProcessPoolExecutor | None = None
+
+    def start(self, initializer: Callable[[], None] | None = None):
+        """启动进程池"""
+        if self.workers <= 0 or self.executor is not None:
+            return
+        initargs = ()
+        if initializer is not None:
+            initargs = (dict(clovers_config), initializer.__module__, initializer.__qualname__)
+        self.executor = ProcessPoolExecutor(self.workers, RenderContext(), initializer=initializer and init_process, initargs=initargs)
+        for _ in range(self.workers):
+            self.executor.submit(time.sleep, 0)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def run[T](self, func: Callable[..., T], *args) -> T:
+        if (executor := self.executor) is not None:
+            try:
+                payload = pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # 参数不能 pickle（如局部函数），在事件循环中绘制
+                return func(*args)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, call, payload)
+            except BrokenProcessPool:
+                self.shutdown()
+        return func(*args)
+
+    async def draw(self, card: Card) -> IMG:
+        """绘制单张卡片"""
+        return await self.run(card.draw)
+
+    async def splice(self, info: list[IMG | Card | bytes], BG_path: Path, BG_type: str):
+        """绘制并拼接资料卡"""
+        return await self.run(splice, info, BG_path, BG_type)
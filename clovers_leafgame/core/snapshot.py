@@ -0,0 +1,171 @@
+"""
+紧凑存档格式
+    文件头：标识，版本，标记，crc32
+    内容：无缩进 JSON（可选 zlib 压缩），记录只保存非默认值，库存的 key 统一保存在 keys 里，
+    库存保存为 [序号, 数量, 序号, 数量...]。
+    紧凑存档由本插件写入并经过 crc32 校验，读取时不再经过 pydantic 验证。
+"""
+
+import os
+import gc
+import json
+import zlib
+import struct
+from pathlib import Path
+from datetime import datetime
+from pydantic import BaseModel
+from .data import Bank, slot, User, Group, Account, Stock, DataBase
+
+MAGIC = b"LGSN"
+VERSION = 1
+HEADER = struct.Struct("<4sBBI")
+FLAG_ZLIB = 1
+BANK_FIELDS = {"user_dict": ("bank", "invest"), "group_dict": ("bank", "invest"), "account_dict": ("bank",)}
+
+
+def dump_document(data: DataBase, compact: bool):
+    """复制数据，compact 时只复制非默认值"""
+    return data.model_dump(mode="json", exclude_defaults=compact)
+
+
+def encode(document: dict, compress: bool = True):
+    keys: dict[str, int] = {}
+
+    def intern(bank: dict[str, int]):
+        flat = []
+        for key, n in bank.items():
+            flat.append(keys.setdefault(key, len(keys)))
+            flat.append(n)
+        return flat
+
+    for field, bank_fields in BANK_FIELDS.items():
+        for record in document.get(field, {}).values():
+            for bank_field in bank_fields:
+                if bank_field in record:
+                    record[bank_field] = intern(record[bank_field])
+    document["keys"] = list(keys)
+    payload = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode()
+    flags = 0
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= FLAG_ZLIB
+    return HEADER.pack(MAGIC, VERSION, flags, zlib.crc32(payload)) + payload
+
+
+def decode(buffer: bytes):
+    magic, version, flags, crc = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("不是紧凑存档")
+    if version != VERSION:
+        raise ValueError(f"不支持的存档版本：{version}")
+    payload = buffer[HEADER.size :]
+    if zlib.crc32(payload) != crc:
+        raise ValueError("存档校验失败")
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+def builder(model: type[BaseModel]):
+    """
+    不经验证的构造函数
+        与 model_construct 相同，但默认值提前整理好，省去逐字段处理。仅用于没有私有属性的模型。
+    """
+    defaults = {}
+    for name, field in model.model_fields.items():
+        if field.is_required():
+            continue
+        default = field.get_default(call_default_factory=True)
+        if isinstance(default, (dict, list, Bank)) and not default:
+            defaults[name] = type(default)
+        else:
+            defaults[name] = lambda default=default: default
+
+    def build(record: dict):
+        fields_set = set(record)
+        for name, default in defaults.items():
+            if name not in fields_set:
+                record[name] = default()
+        obj = model.__new__(model)
+        object.__setattr__(obj, "__dict__", record)
+        object.__setattr__(obj, "__pydantic_fields_set__", fields_set)
+        object.__setattr__(obj, "__pydantic_extra__", None)
+        object.__setattr__(obj, "__pydantic_private__", None)
+        return obj
+
+    return build
+
+
+def construct(document: dict):
+    """不经验证直接构造 DataBase"""
+    keys: list[str] = document.get("keys", [])
+
+    slots = list(map(slot, keys))
+
+    def bank(flat: list[int]):
+        result = Bank()
+        for i, n in zip(flat[::2], flat[1::2]):
+            result.store(slots[i], n)
+        return result
+
+    build_stock = builder(Stock)
+
+    def records(field: str, model: type[User | Group | Account]):
+        result = {}
+        bank_fields = BANK_FIELDS[field]
+        build = builder(model)
+        for key, record in document.get(field, {}).items():
+            for bank_field in bank_fields:
+                if bank_field in record:
+                    record[bank_field] = bank(record[bank_field])
+            if sign_in := record.get("sign_in"):
+                record["sign_in"] = datetime.fromisoformat(sign_in)
+            if stock := record.get("stock"):
+                stock["exchange"] = {k: tuple(v) for k, v in stock.get("exchange", {}).items()}
+                stock["bids"] = {k: tuple(v) for k, v in stock.get("bids", {}).items()}
+                record["stock"] = build_stock(stock)
+            result[key] = build(record)
+        return result
+
+    return DataBase.model_construct(
+        user_dict=records("user_dict", User),
+        group_dict=records("group_dict", Group),
+        account_dict=records("account_dict", Account),
+        extra=document.get("extra", {}),
+    )
+
+
+def is_snapshot(file: Path):
+    with open(file, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load(file: Path):
+    """
+    读取存档，JSON 存档经过完整验证，紧凑存档直接构造
+        读取期间暂停垃圾回收，避免大量新建对象反复触发完整回收
+    """
+    if not file.exists():
+        return DataBase()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if is_snapshot(file):
+            return construct(decode(file.read_bytes()))
+        return DataBase.load(file)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write(file: Path, document: dict, compact: bool, compress: bool = True):
+    """写入临时文件后替换，写入前 fsync"""
+    tmp = file.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        if compact:
+            f.write(encode(document, compress))
+        else:
+            f.write(json.dumps(document, ensure_ascii=False, indent=4).encode())
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(file)
@@ -0,0 +1,105 @@
+from .data import User, Group, Account, DataBase
+from .rank import RankIndex
+
+STATS = ("win", "lose", "win_achieve", "lose_achieve")
+"""胜场，败场，连胜，连败"""
+TOTAL = "总"
+"""全部游戏合计的统计名"""
+
+
+class MatchStats:
+    """
+    对局统计
+        每个用户的统计保存在 User.extra["match"]：{游戏名: [胜场, 败场, 连胜, 连败]}，TOTAL 为全部游戏的合计
+        路灯挂件为各群 extra["revolution_achieve"] 的合计
+    排行索引在首次查询时建立，之后每场对局只更新双方
+    """
+
+    def __init__(self) -> None:
+        self.data = DataBase()
+        self.indexes: dict[tuple[str, str], RankIndex] = {}
+        self.revolution_index: RankIndex | None = None
+
+    def bind(self, data: DataBase):
+        """换用新读取的数据，清空索引并迁移旧版统计"""
+        self.data = data
+        self.indexes.clear()
+        self.revolution_index = None
+        legacy = {stat: data.extra.pop(stat) for stat in STATS if isinstance(data.extra.get(stat), dict)}
+        legacy.update(data.extra.pop("ranklist", {}))
+        for i, stat in enumerate(STATS):
+            for user_id, n in legacy.get(stat, {}).items():
+                if user_id in data.user_dict:
+                    user = data.user(user_id)
+                    self.stats(user, TOTAL)[i] = n
+                    data.touch(user)
+
+    @staticmethod
+    def stats(user: User, game: str) -> list[int]:
+        return user.extra.setdefault("match", {}).setdefault(game, [0, 0, 0, 0])
+
+    def record(self, game: str, win_id: str, lose_id: str):
+        """
+        记录一场对局
+            return:胜者与败者的合计统计
+        """
+        winner = self.data.user(win_id)
+        loser = self.data.user(lose_id)
+        self.data.touch(winner)
+        self.data.touch(loser)
+        for name in (TOTAL, game):
+            win_stats = self.stats(winner, name)
+            lose_stats = self.stats(loser, name)
+            win_stats[0] += 1
+            win_stats[2] += 1
+            win_stats[3] = 0
+            lose_stats[1] += 1
+            lose_stats[2] = 0
+            lose_stats[3] += 1
+            for user_id, stats in ((win_id, win_stats), (lose_id, lose_stats)):
+                for stat, n in zip(STATS, stats):
+                    if (index := self.indexes.get((name, stat))) is not None:
+                        index.set(user_id, n)
+        return self.stats(winner, TOTAL), self.stats(loser, TOTAL)
+
+    def ranking(self, game: str, stat: str):
+        """对局统计排名索引"""
+        if (index := self.indexes.get((game, stat))) is None:
+            index = self.indexes[game, stat] = RankIndex()
+            i = STATS.index(stat)
+            for user_id, user in self.data.user_dict.items():
+                if (stats := user.extra.get("match", {}).get(game)) and stats[i]:
+                    index.set(user_id, stats[i])
+        return index
+
+    def revolution(self, group: Group, user_id: str):
+        """记录一次路灯挂件"""
+        revolution_achieve: dict = group.extra.setdefault("revolution_achieve", {})
+        revolution_achieve[user_id] = revolution_achieve.get(user_id, 0) + 1
+        self.data.touch(group)
+        if self.revolution_index is not None:
+            self.revolution_index.update(user_id, 1)
+
+    def revolution_ranking(self):
+        """路灯挂件排名索引"""
+        if self.revolution_index is None:
+            self.data.load_all()
+            index = self.revolution_index = RankIndex()
+            for group in self.data.group_dict.values():
+                for user_id, n in group.extra.get("revolution_achieve", {}).items():
+                    index.update(user_id, n)
+        return self.revolution_index
+
+    def on_change(self, field: str, bank: str, record: User | Group | Account, key: str, delta: int):
+        if bank != "record":
+            return
+        match field:
+            case "user_dict":
+                match_stats = record.extra.get("match", {})
+                for (game, stat), index in self.indexes.items():
+                    stats = match_stats.get(game)
+                    index.set(record.id, stats[STATS.index(stat)] if stats and delta > 0 else 0)
+            case "group_dict":
+                if self.revolution_index is not None:
+                    for user_id, n in record.extra.get("revolution_achieve", {}).items():
+                        self.revolution_index.update(user_id, n * delta)
@@ -0,0 +1,414 @@
+import os
+import json
+import sqlite3
+from pathlib import Path
+from functools import partial
+from collections.abc import Callable
+from pydantic_core import to_json, to_jsonable_python
+from urllib.parse import quote, unquote
+from .data import User, Group, Account, DataBase, ShardDict
+from . import snapshot as snapshot_format
+
+
+class JSONStorage:
+    """
+    JSON 存档
+        russian_data.json:完整存档
+        russian_data.snap:完整存档（紧凑格式）
+        russian_data.delta:增量记录，每行一次保存
+    每次完整保存的世代号 +1，保存在 extra["snapshot"]，增量记录带有写入时的世代号，
+    读取时跳过世代号与完整存档不同的增量（完整保存后未能删除的旧增量）
+    """
+
+    def __init__(self, main_path: Path, compact_interval: int = 6, compact: bool = False, compress: bool = True) -> None:
+        self.JSON_PATH = main_path / "russian_data.json"
+        self.SNAP_PATH = main_path / "russian_data.snap"
+        self.DELTA_PATH = main_path / "russian_data.delta"
+        self.compact_interval = compact_interval
+        self.compact = compact
+        self.compress = compress
+        self.delta_count = 0
+
+    @property
+    def DATA_PATH(self):
+        return self.SNAP_PATH if self.compact else self.JSON_PATH
+
+    def latest(self):
+        """两种格式的完整存档都存在时读取较新的一个"""
+        files = [f for f in (self.JSON_PATH, self.SNAP_PATH) if f.exists()]
+        if not files:
+            return self.DATA_PATH
+        return max(files, key=lambda f: f.stat().st_mtime)
+
+    def load(self):
+        data = snapshot_format.load(self.latest())
+        generation = data.extra.get("snapshot", 0)
+        self.delta_count = 0
+        if self.DELTA_PATH.exists():
+            with open(self.DELTA_PATH, "r+b") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError(line)
+                        delta = json.loads(line) if line.strip() else None
+                    except ValueError:
+                        # 追加时中断留下的不完整记录：截断，之后的增量从新的一行开始。这次保存的日志世代没有删除，修改由日志恢复
+                        f.truncate(offset)
+                        break
+                    offset += len(line)
+                    if delta is None or delta.get("snapshot", 0) != generation:
+                        continue
+                    data.apply_delta(delta)
+                    self.delta_count += 1
+        return data
+
+    def snapshot(self, data: DataBase, full: bool = False) -> Callable[[], None]:
+        """
+        在当前线程复制需要保存的数据，返回写入磁盘的任务
+            只把修改过的记录追加到 DELTA_PATH，每 compact_interval 次合并为一次完整保存
+        """
+        if full or data.outdated or self.delta_count >= self.compact_interval:
+            data.extra["snapshot"] = data.extra.get("snapshot", 0) + 1
+            document = snapshot_format.dump_document(data, self.compact)
+            data.clean()
+            self.delta_count = 0
+            return partial(self.write, document)
+        delta: dict = data.pop_dirty()
+        if not delta:
+            return lambda: None
+        delta = {field: {key: record and record.model_dump(mode="json") for key, record in records.items()} for field, records in delta.items()}
+        delta["extra"] = to_jsonable_python(data.extra)
+        delta["snapshot"] = data.extra.get("snapshot", 0)
+        self.delta_count += 1
+        return partial(self.append, delta)
+
+    def write(self, document: dict):
+        snapshot_format.write(self.DATA_PATH, document, self.compact, self.compress)
+        (self.JSON_PATH if self.compact else self.SNAP_PATH).unlink(True)
+        self.DELTA_PATH.unlink(True)
+
+    def append(self, delta: dict):
+        with open(self.DELTA_PATH, "a", encoding="utf8") as f:
+            f.write(json.dumps(delta, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SQLiteStorage:
+    """
+    SQLite 存档
+        记录本身以 JSON 保存，库存拆分为 (owner, prop_id, n) 行
+        保存时只写入修改过的记录，每次保存（包括 extra 中的日志世代）在一个事务中提交，提交时同步到磁盘
+        与 JSON 存档一样，读取时全部记录载入内存，游戏中的修改只在保存时写入数据库，两次保存之间的库存变化由日志记录
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_dict (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS group_dict (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS account_dict (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, group_id TEXT NOT NULL, data TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS account_group ON account_dict (group_id);
+    CREATE TABLE IF NOT EXISTS bank (
+        kind TEXT NOT NULL,
+        owner TEXT NOT NULL,
+        field TEXT NOT NULL,
+        prop_id TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (kind, owner, field, prop_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS extra (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+    """
+    models = {"user_dict": User, "group_dict": Group, "account_dict": Account}
+
+    def __init__(self, file: Path) -> None:
+        self.file = file
+        self.conn = sqlite3.connect(file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(self.SCHEMA)
+
+    def load(self):
+        banks: dict[tuple[str, str], dict[str, dict[str, int]]] = {}
+        for kind, owner, field, prop_id, n in self.conn.execute("SELECT kind, owner, field, prop_id, n FROM bank"):
+            banks.setdefault((kind, owner), {}).setdefault(field, {})[prop_id] = n
+        kwargs = {}
+        for kind, model in self.models.items():
+            kwargs[kind] = {
+                key: model.model_validate(json.loads(data) | banks.get((kind, key), {}))
+                for key, data in self.conn.execute(f"SELECT id, data FROM {kind}")
+            }
+        if row := self.conn.execute("SELECT data FROM extra WHERE id = 'extra'").fetchone():
+            kwargs["extra"] = json.loads(row[0])
+        return DataBase(**kwargs)
+
+    @staticmethod
+    def row(kind: str, key: str, record: User | Group | Account | None):
+        """复制一条记录：(kind, key, 记录, 库存行)"""
+        if record is None:
+            return kind, key, None, []
+        fields = ("bank",) if kind == "account_dict" else ("bank", "invest")
+        data = record.model_dump_json(exclude=set(fields))
+        if isinstance(record, Account):
+            data = (record.user_id, record.group_id, data)
+        banks = [(kind, key, field, prop_id, n) for field in fields for prop_id, n in getattr(record, field).items() if n]
+        return kind, key, data, banks
+
+    def snapshot(self, data: DataBase, full: bool = False) -> Callable[[], None]:
+        """在当前线程复制需要保存的数据，返回写入数据库的任务"""
+        full = full or data.outdated
+        if full:
+            rows = [self.row(kind, key, record) for kind in self.models for key, record in getattr(data, kind).items()]
+            data.clean()
+        else:
+            rows = [self.row(kind, key, record) for kind, records in data.pop_dirty().items() for key, record in records.items()]
+        return partial(self.write, rows, to_json(data.extra).decode(), full)
+
+    def write(self, rows: list, extra: str, full: bool):
+        conn = self.conn
+        with conn:
+            if full:
+                for kind in self.models:
+                    conn.execute(f"DELETE FROM {kind}")
+                conn.execute("DELETE FROM bank")
+            for kind, key, data, banks in rows:
+                conn.execute("DELETE FROM bank WHERE kind = ? AND owner = ?", (kind, key))
+                if data is None:
+                    conn.execute(f"DELETE FROM {kind} WHERE id = ?", (key,))
+                    continue
+                if kind == "account_dict":
+                    conn.execute("INSERT OR REPLACE INTO account_dict (id, user_id, group_id, data) VALUES (?, ?, ?, ?)", (key, *data))
+                else:
+                    conn.execute(f"INSERT OR REPLACE INTO {kind} (id, data) VALUES (?, ?)", (key, data))
+                conn.executemany("INSERT INTO bank (kind, owner, field, prop_id, n) VALUES (?, ?, ?, ?, ?)", banks)
+            conn.execute("INSERT OR REPLACE INTO extra (id, data) VALUES ('extra', ?)", (extra,))
+
+
+class ShardStorage:
+    """
+    分片存档
+        shards/index.json:extra，有股票的群，未完成的替换
+        shards/users.shard:全部用户
+        shards/groups/{group_id}.shard:群，群内账户
+    启动时只加载用户和有股票的群，其他群在第一次访问时加载。
+    保存时只写入修改过的分片，连续 evict_after 次保存未修改的群会被移出内存。
+    分片先写入 .pending，index.json 记录待替换的分片后再替换，中途退出时在下次启动时完成替换。
+    """
+
+    def __init__(
+        self,
+        main_path: Path,
+        compact: bool = False,
+        compress: bool = True,
+        evict_after: int = 6,
+        on_load: Callable[[Group], None] | None = None,
+        on_evict: Callable[[Group], None] | None = None,
+    ) -> None:
+        self.main_path = main_path
+        self.path = main_path / "shards"
+        self.groups_path = self.path / "groups"
+        self.groups_path.mkdir(exist_ok=True, parents=True)
+        self.INDEX_PATH = self.path / "index.json"
+        self.USERS_PATH = self.path / "users.shard"
+        self.compact = compact
+        self.compress = compress
+        self.evict_after = evict_after
+        self.on_load = on_load
+        self.on_evict = on_evict
+        self.known: set[str] = set()
+        """磁盘上有分片的群"""
+        self.loaded: set[str] = set()
+        """已加载（或已删除）的群"""
+        self.idle: dict[str, int] = {}
+        self.data = DataBase()
+
+    def group_file(self, group_id: str):
+        return self.groups_path / f"{quote(group_id, safe='')}.shard"
+
+    def read_index(self) -> dict:
+        if not self.INDEX_PATH.exists():
+            return {}
+        with open(self.INDEX_PATH, "r", encoding="utf8") as f:
+            index = json.load(f)
+        for name in index.get("pending", []):
+            file = self.path / name
+            pending = file.with_suffix(".pending")
+            if pending.exists():
+                pending.replace(file)
+        for name in index.get("removed", []):
+            (self.path / name).unlink(True)
+        return index
+
+    def load(self):
+        if not self.INDEX_PATH.exists() and (JSONStorage(self.main_path).latest().exists()):
+            self.snapshot(JSONStorage(self.main_path).load(), True)()
+        index = self.read_index()
+        data = self.data = snapshot_format.load(self.USERS_PATH)
+        data.extra = index.get("extra", {})
+        self.known = {unquote(f.stem) for f in self.groups_path.glob("*.shard")}
+        self.loaded = set()
+        self.idle = {}
+        data.group_dict = ShardDict({}, self.locate_group, self.load_all)
+        data.account_dict = ShardDict({}, self.locate_account, self.load_all)
+        for group_id in index.get("stock_groups", []):
+            self.locate_group(group_id)
+        return data
+
+    def locate_group(self, group_id: str):
+        """加载群分片，返回是否加载了新的分片"""
+        if group_id in self.loaded or group_id not in self.known:
+            return False
+        self.loaded.add(group_id)
+        shard = snapshot_format.load(self.group_file(group_id))
+        data = self.data
+        for key, account in shard.account_dict.items():
+            dict.__setitem__(data.account_dict, key, account)
+            data.bind(account)
+        for key, group in shard.group_dict.items():
+            dict.__setitem__(data.group_dict, key, group)
+            data.bind(group)
+            if self.on_load:
+                self.on_load(group)
+        return True
+
+    def locate_account(self, account_id: str):
+        group_id = self.account_group(self.data, account_id)
+        return group_id is not None and self.locate_group(group_id)
+
+    @staticmethod
+    def account_group(data: DataBase, account_id: str):
+        """
+        账户所在的群
+            已加载的账户读取记录，否则由用户的 accounts_map 查找（用户全部在内存中），用户 id 与群 id 都可能包含 "-"
+        """
+        if account := dict.get(data.account_dict, account_id):
+            return account.group_id
+        user_dict = data.user_dict
+        for i, c in enumerate(account_id):
+            if c == "-" and (user := user_dict.get(account_id[:i])) and user.accounts_map.get(group_id := account_id[i + 1 :]) == account_id:
+                return group_id
+        return None
+
+    def load_all(self):
+        for group_id in self.known - self.loaded:
+            self.locate_group(group_id)
+
+    def shard(self, data: DataBase, group_id: str):
+        """复制一个群分片，群已删除时返回 None"""
+        group = dict.get(data.group_dict, group_id)
+        if group is None:
+            return None
+        accounts = {account_id: account for account_id in group.accounts_map.values() if (account := dict.get(data.account_dict, account_id))}
+        return {
+            "group_dict": {group_id: group.model_dump(mode="json", exclude_defaults=self.compact)},
+            "account_dict": {key: account.model_dump(mode="json", exclude_defaults=self.compact) for key, account in accounts.items()},
+        }
+
+    def evict(self, data: DataBase, group_id: str):
+        """把群分片移出内存"""
+        group = dict.pop(data.group_dict, group_id)
+        for account_id in group.accounts_map.values():
+            dict.pop(data.account_dict, account_id, None)
+        self.loaded.discard(group_id)
+        self.idle.pop(group_id, None)
+        if self.on_evict:
+            self.on_evict(group)
+
+    def snapshot(self, data: DataBase, full: bool = False) -> Callable[[], None]:
+        """在当前线程复制需要保存的分片，返回写入磁盘的任务"""
+        full = full or data.outdated
+        dirty = data.pop_dirty()
+        if full:
+            save_users = True
+            groups = set(data.group_dict) | set(dirty.get("group_dict", {}))
+            data.clean()
+        else:
+            save_users = "user_dict" in dirty
+            groups = set(dirty.get("group_dict", {}))
+            # 已注销的账户所在的群在注销时已标记
+            groups.update(group_id for account_id in dirty.get("account_dict", {}) if (group_id := self.account_group(data, account_id)))
+        users = None
+        if save_users:
+            users = {"user_dict": {key: user.model_dump(mode="json", exclude_defaults=self.compact) for key, user in data.user_dict.items()}}
+        shards = {group_id: self.shard(data, group_id) for group_id in groups}
+        index = {
+            "extra": to_jsonable_python(data.extra),
+            "stock_groups": [group_id for group_id, group in data.group_dict.items() if group.stock],
+        }
+        for group_id, document in shards.items():
+            if document is None:
+                self.known.discard(group_id)
+            else:
+                self.known.add(group_id)
+                self.idle[group_id] = 0
+        if data is self.data:
+            stock_groups = set(index["stock_groups"])
+            for group_id in list(dict.keys(data.group_dict)):
+                if group_id in groups or group_id in stock_groups:
+                    continue
+                self.idle[group_id] = idle = self.idle.get(group_id, 0) + 1
+                if idle >= self.evict_after:
+                    self.evict(data, group_id)
+        return partial(self.write, users, shards, index)
+
+    def write(self, users: dict | None, shards: dict[str, dict | None], index: dict):
+        pending = []
+        removed = []
+        if users is not None:
+            snapshot_format.write(self.USERS_PATH.with_suffix(".pending"), users, self.compact, self.compress)
+            pending.append(self.USERS_PATH.name)
+        for group_id, document in shards.items():
+            file = self.group_file(group_id)
+            name = file.relative_to(self.path).as_posix()
+            if document is None:
+                removed.append(name)
+                continue
+            snapshot_format.write(file.with_suffix(".pending"), document, self.compact, self.compress)
+            pending.append(name)
+        index["pending"] = pending
+        index["removed"] = removed
+        snapshot_format.write(self.INDEX_PATH, index, False)
+        self.read_index()
+        index["pending"] = []
+        index["removed"] = []
+        snapshot_format.write(self.INDEX_PATH, index, False)
+
+    def collect(self, data: DataBase, compact: bool) -> Callable[[], dict]:
+        """
+        复制完整存档（用于备份）
+            已加载的记录在当前线程复制，未加载的分片在返回的任务中从磁盘读取
+        """
+        document = snapshot_format.dump_document(data, compact)
+        unloaded = [self.group_file(group_id) for group_id in self.known - self.loaded]
+
+        def task():
+            for file in unloaded:
+                if not file.exists():
+                    continue
+                shard = snapshot_format.dump_document(snapshot_format.load(file), compact)
+                document["group_dict"].update(shard["group_dict"])
+                document["account_dict"].update(shard["account_dict"])
+            return document
+
+        return task
+
+
+def migrate(main_path: Path, file: Path):
+    """
+    把 russian_data.json（及未合并的增量记录）导入 SQLite 存档
+        先导入到 .tmp 文件，完成后再替换，导入失败时不会留下空的存档
+    """
+    tmp = file.with_suffix(".tmp")
+    sidecars = [tmp.with_name(tmp.name + suffix) for suffix in ("-wal", "-shm")]
+    for f in (tmp, *sidecars):
+        f.unlink(True)
+    storage = SQLiteStorage(tmp)
+    try:
+        storage.snapshot(JSONStorage(main_path).load(), True)()
+    except:
+        storage.conn.close()
+        for f in (tmp, *sidecars):
+            f.unlink(True)
+        raise
+    storage.conn.close()
+    os.replace(tmp, file)
+    return SQLiteStorage(file)
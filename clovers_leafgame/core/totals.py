@@ -0,0 +1,39 @@
+from .data import User, Group, Account, DataBase
+
+
+class GroupTotals:
+    """
+    群成员库存合计
+        (群id, 道具id) -> 群内全部个人账户中该道具的数量之和，不含群自己的库存
+        首次查询时扫描群成员建立，之后订阅库存变化增减（账户注册，注销时的全部库存也会通知）
+        成员数即 len(group.accounts_map)
+    """
+
+    def __init__(self) -> None:
+        self.data = DataBase()
+        self.totals: dict[tuple[str, str], int] = {}
+
+    def bind(self, data: DataBase):
+        """换用新读取的数据"""
+        self.data = data
+        self.totals.clear()
+
+    def clear(self):
+        """数据被整体修改后调用，下次查询时重新扫描"""
+        self.totals.clear()
+
+    def total(self, group: Group, prop_id: str):
+        key = (group.id, prop_id)
+        if (n := self.totals.get(key)) is None:
+            account_dict = self.data.account_dict
+            n = self.totals[key] = sum(account_dict[account_id].bank[prop_id] for account_id in group.accounts_map.values())
+        return n
+
+    def on_change(self, field: str, bank: str, record: User | Group | Account, key: str, delta: int):
+        match field, bank:
+            case "account_dict", "bank":
+                if (group_key := (record.group_id, key)) in self.totals:
+                    self.totals[group_key] += delta
+            case "group_dict", "record" if delta < 0:
+                for group_key in [group_key for group_key in self.totals if group_key[0] == record.id]:
+                    del self.totals[group_key]
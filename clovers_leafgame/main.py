@@ -4,6 +4,7 @@ from clovers.core.plugin import Plugin, Result
 from clovers.core.config import config as clovers_config
 from clovers_leafgame.core.clovers import Event
 from .manager import Manager
+from .core.render import render_process
 from .config import Config
 
 config_key = __package__
@@ -32,5 +33,19 @@ def build_result(result):
 plugin = Plugin(build_event=lambda event: Event(event), build_result=build_result)
 """小游戏插件实例"""
 
-manager = Manager(config_data.main_path)
-"""小游戏管理器实例"""
+manager: Manager = None  # type: ignore
+"""小游戏管理器实例，渲染进程中为 None（渲染进程只导入绘图函数，不读取游戏数据）"""
+if not render_process():
+    manager = Manager(
+        config_data.main_path,
+        config_data.compact_interval,
+        config_data.storage,
+        config_data.snapshot_format,
+        config_data.snapshot_compress,
+        config_data.backup_base_interval,
+        tuple(config_data.backup_retention),
+        config_data.avatar_ttl,
+        config_data.avatar_cache_size,
+        config_data.render_cache_ttl,
+        config_data.render_workers,
+    )
@@ -5,68 +5,253 @@
 ————————————————————
 +++++++++++++++++"""
 
+import time
+import math
+import asyncio
+from io import BytesIO
 from datetime import datetime, timedelta
 from pathlib import Path
 from collections import Counter
-from clovers.utils.linecard import info_splicing, ImageList
+from collections.abc import Callable
+from PIL.Image import Image as IMG
 from clovers.utils.library import Library
 from .core.clovers import Event
-from .core.data import Account, Group, Account, DataBase
+from .core.data import Account, Group, Account, DataBase, Listener
+from .core.storage import JSONStorage, SQLiteStorage, ShardStorage, migrate
+from .core.journal import Journal
+from .core.backup import BackupStore
+from .core.stats import MatchStats
+from .core.totals import GroupTotals
+from .core.avatar import AvatarCache
+from .core.prices import PriceStore
+from .core.render import RenderCache, Renderer, Card
+from .core import snapshot as snapshot_format
+from .core import background
 from .item import Prop, props_library, marking_library, VIP_CARD
 
 
+class GroupLibrary(Library[str, Group]):
+    """按群 id 查找不到时到数据中查找（必要时加载该群的分片）并加入索引"""
+
+    def __init__(self, locate: Callable[[str], Group | None]) -> None:
+        super().__init__()
+        self.locate = locate
+
+    def get(self, index: str, default=None):
+        group = super().get(index)
+        if group is None:
+            group = self.locate(index)
+        return default if group is None else group
+
+
 class Manager:
     data: DataBase
     main_path: Path
 
-    def __init__(self, main_path: str | Path) -> None:
+    def __init__(
+        self,
+        main_path: str | Path,
+        compact_interval: int = 6,
+        storage: str = "json",
+        snapshot: str = "json",
+        compress: bool = True,
+        backup_base_interval: int = 6,
+        backup_retention: tuple[int, int, int] = (24, 7, 4),
+        avatar_ttl: int = 86400,
+        avatar_cache_size: int = 256,
+        render_cache_ttl: int = 60,
+        render_workers: int = 1,
+    ) -> None:
         self.main_path = Path(main_path)
-        self.DATA_PATH = self.main_path / "russian_data.json"
         self.BG_PATH = self.main_path / "BG_image"
         self.BG_PATH.mkdir(exist_ok=True, parents=True)
         self.backup_path = self.main_path / "backup"
         self.backup_path.mkdir(exist_ok=True, parents=True)
+        self.backups = BackupStore(self.backup_path, backup_base_interval, backup_retention)
+        self.avatars = AvatarCache(self.main_path / "avatar_cache", avatar_ttl, avatar_cache_size)
+        self.render_cache = RenderCache(ttl=render_cache_ttl)
+        self.chart_cache = RenderCache(256, math.inf)
+        """K线图 PNG，按最后一根K线缓存"""
+        self.renderer = Renderer(render_workers)
+        self.snapshot_compact = snapshot == "compact"
+        self.compress = compress
         self.props_library = props_library
         self.marking_library = marking_library
-        self.group_library: Library[str, Group] = Library()
+        self.group_library = GroupLibrary(self.locate_group)
+        self.storage: JSONStorage | SQLiteStorage | ShardStorage
+        match storage:
+            case "sqlite":
+                file = self.main_path / "russian_data.db"
+                if file.exists():
+                    self.storage = SQLiteStorage(file)
+                else:
+                    self.storage = migrate(self.main_path, file)
+            case "shard":
+                self.storage = ShardStorage(
+                    self.main_path,
+                    self.snapshot_compact,
+                    compress,
+                    compact_interval,
+                    on_load=self.index_group,
+                    on_evict=self.unindex_group,
+                )
+            case _:
+                self.storage = JSONStorage(self.main_path, compact_interval, self.snapshot_compact, compress)
+        self.journal = Journal(self.main_path / "journal")
+        self.prices = PriceStore(self.main_path / "prices")
+        self.listeners: list[Listener] = []
+        """库存变化的订阅者，重新读取数据后保留"""
+        self.match_stats = MatchStats()
+        self.subscribe(self.match_stats.on_change)
+        self.group_totals = GroupTotals()
+        self.subscribe(self.group_totals.on_change)
+        self.save_lock = asyncio.Lock()
         self.load()
 
-    def save(self):
-        with open(self.DATA_PATH, "w", encoding="utf8") as f:
-            f.write(self.data.model_dump_json(indent=4))
+    def snapshot(self, full: bool = False):
+        """
+        复制需要保存的数据并换用新的日志世代
+            return:写入磁盘的任务，可以在其他线程执行，失败时须在当前线程调用 self.data.touch_all()
+        """
+        generation = self.data.extra["journal"] = self.data.extra.get("journal", 0) + 1
+        self.journal.open(generation)
+        write = self.storage.snapshot(self.data, full)
+        flush_prices = self.prices.snapshot()
+
+        def task():
+            flush_prices()
+            write()
+            self.journal.clean(generation)
+
+        return task
+
+    def save(self, full: bool = False):
+        task = self.snapshot(full)
+        try:
+            task()
+        except:
+            self.data.touch_all()
+            raise
+
+    async def async_save(self, full: bool = False):
+        """
+        保存游戏数据，磁盘写入在线程中进行
+            return:事件循环暂停的时间
+        """
+        async with self.save_lock:
+            start = time.perf_counter()
+            task = self.snapshot(full)
+            pause = time.perf_counter() - start
+            try:
+                await asyncio.to_thread(task)
+            except:
+                # 写入失败，下次保存时重新写入全部记录
+                self.data.touch_all()
+                raise
+        return pause
+
+    def compact(self):
+        """完整保存游戏数据"""
+        self.save(True)
 
     def load(self):
-        self.data = DataBase.load(self.DATA_PATH)
+        self.data = self.storage.load()
+        if n := self.journal.replay(self.data):
+            print(f"已从日志恢复 {n} 条记录")
+            self.save()
+        else:
+            self.journal.open(self.data.extra.get("journal", 0))
+        self.data.set_journal(self.journal)
+        self.data.set_listeners(self.listeners)
+        self.match_stats.bind(self.data)
+        self.group_totals.bind(self.data)
         for group in self.data.group_dict.values():
-            if (stock := group.stock) and (stock_name := stock.name):
-                self.group_library.set_item(group.id, {stock_name}, group)
-            else:
-                self.group_library[group.id] = group
+            self.index_group(group)
+            if "stock_record" in group.extra or "stock_ohlc" in group.extra:
+                self.prices.adopt(group.id, group.extra.pop("stock_record", []), group.extra.pop("stock_ohlc", None))
+                self.data.touch(group)
+
+    def subscribe(self, listener: Listener):
+        """订阅库存变化，见 DataBase.subscribe"""
+        self.listeners.append(listener)
+
+    def locate_group(self, group_id: str):
+        if group := self.data.group_dict.get(group_id):
+            self.index_group(group)
+        return group
+
+    def index_group(self, group: Group):
+        if (stock := group.stock) and (stock_name := stock.name):
+            self.group_library.set_item(group.id, {stock_name}, group)
+        else:
+            self.group_library[group.id] = group
+
+    def unindex_group(self, group: Group):
+        if group.id in self.group_library.keys():
+            del self.group_library[group.id]
 
     def backup(self):
-        date_today, now_time = datetime.now().strftime("%Y-%m-%d %H-%M-%S").split()
-        backup_today = self.backup_path / date_today
-        if not backup_today.exists():
-            backup_today.mkdir(mode=755)
-        file = backup_today / f"russian_data {now_time}.json"
-        file.write_text(self.data.model_dump_json(indent=4), "utf8")
+        self.backup_task()()
+
+    async def async_backup(self):
+        """
+        备份游戏数据，磁盘写入在线程中进行
+            return:事件循环暂停的时间
+        """
+        async with self.save_lock:
+            start = time.perf_counter()
+            task = self.backup_task()
+            pause = time.perf_counter() - start
+            await asyncio.to_thread(task)
+        return pause
+
+    def backup_task(self):
+        now = datetime.now()
+        if isinstance(self.storage, ShardStorage):
+            collect = self.storage.collect(self.data, True)
+        else:
+            document = snapshot_format.dump_document(self.data, True)
+            collect = lambda: document
+        return lambda: self.backups.write(collect(), now)
 
     def clean_backup(self, delta: int | float):
-        folders = [f for f in self.backup_path.iterdir() if f.is_dir()]
-        info = []
-        for folder in folders:
-            if datetime.now().timestamp() - folder.stat().st_birthtime > delta:
-                folder.unlink(True)
-                info.append(f"备份 {folder} 已删除！")
+        """
+        按保留策略清理备份
+            delta:旧版备份文件夹的保留时间（秒）
+        """
+        info = [f"备份 {name} 已删除！" for name in self.backups.clean_legacy(delta)]
+        info += [f"备份 {name} 已删除！" for name in self.backups.prune()]
         return "\n".join(info)
 
-    def info_card(self, info: ImageList, user_id: str, BG_type=None):
+    async def set_background(self, user_id: str, data: bytes | None = None):
+        """
+        预处理并保存背景
+            data:新上传的图片，为 None 时按当前的蒙版类型重新处理已有的背景
+        """
+        path = self.BG_PATH / f"{user_id}.png"
+        blur = self.data.user(user_id).extra.get("BG_type") == "GAUSS"
+        try:
+            await self.renderer.run(background.preprocess, path, data, blur)
+        finally:
+            background.forget(path)
+
+    def delete_background(self, user_id: str):
+        path = self.BG_PATH / f"{user_id}.png"
+        path.unlink(True)
+        background.blur_file(path).unlink(True)
+        background.forget(path)
+
+    async def info_card(self, info: list[IMG | Card | bytes], user_id: str, BG_type=None):
+        """
+        资料卡
+            info:图片，绘图说明或 PNG，在渲染进程中绘制并拼接
+        """
         extra = self.data.user(user_id).extra
         BG_type = BG_type or extra.get("BG_type", "#FFFFFF99")
         BG_PATH = self.BG_PATH / f"{user_id}.png"
         if not BG_PATH.exists():
             BG_PATH = self.BG_PATH / "default.png"
-        return info_splicing(info, BG_PATH, spacing=10, BG_type=BG_type)
+        return BytesIO(await self.renderer.splice(info, BG_PATH, BG_type))
 
     def new_account(self, user_id: str, group_id: str, **kwargs):
         account = Account(user_id=user_id, group_id=group_id, sign_in=datetime.today() - timedelta(days=1), **kwargs)
@@ -91,10 +276,13 @@ class Manager:
         if not (account_id and (account := self.data.account_dict.get(account_id))):
             account = self.new_account(user_id, group_id)
         nickname = event.nickname
-        if event.nickname:
-            account.name = nickname
-            if not user.name or event.is_private():
-                user.name = event.nickname
+        if nickname:
+            if account.name != nickname:
+                account.name = nickname
+                self.data.touch(account)
+            if (not user.name or event.is_private()) and user.name != nickname:
+                user.name = nickname
+                self.data.touch(user)
         return user, account
 
     def transfer(
@@ -138,6 +326,12 @@ class Manager:
         wealths.append(group.bank[prop_id])
         return wealths
 
+    def member_wealth(self, group: Group, prop_id: str) -> int:
+        """
+        群成员资产合计，不含群金库
+        """
+        return self.group_totals.total(group, prop_id)
+
     def stock_value(self, invest: Counter[str]):
         value = 0.0
         for group_id, n in invest.items():
@@ -1,5 +1,4 @@
 import random
-from pathlib import Path
 from datetime import datetime
 from PIL import ImageColor
 from collections import Counter
@@ -17,13 +16,14 @@ from clovers_leafgame.item import (
 from clovers_leafgame.output import (
     text_to_image,
     endline,
-    candlestick,
+    kline_chart,
     bank_card,
     prop_card,
     invest_card,
     avatar_card,
     dist_card,
 )
+from clovers_leafgame.core.render import Card
 from clovers.core.config import config as clovers_config
 from .config import Config
 
@@ -69,9 +69,13 @@ async def _(event: Event):
         if not image:
             log.append("图片下载失败")
         else:
-            with open(manager.BG_PATH / f"{user_id}.png", "wb") as f:
-                f.write(image)
-            log.append("图片下载成功")
+            try:
+                await manager.set_background(user_id, image)
+                log.append("图片下载成功")
+            except Exception:
+                log.append("图片读取失败")
+    elif BG_type:
+        await manager.set_background(user_id)
     if log:
         return "\n".join(log)
 
@@ -79,15 +83,17 @@ async def _(event: Event):
 @plugin.handle({"删除背景"}, {"user_id", "to_me"})
 @Check().to_me().check
 async def _(event: Event):
-    Path.unlink(manager.BG_PATH / f"{event.user_id}.png", True)
+    manager.delete_background(event.user_id)
     return "背景图片删除成功！"
 
 
 @plugin.handle({"金币签到", "轮盘签到"}, {"user_id", "group_id", "nickname", "avatar"})
 async def _(event: Event):
     user, account = manager.account(event)
-    if avatar := event.avatar:
+    if (avatar := event.avatar) and avatar != user.avatar_url:
         user.avatar_url = avatar
+        manager.data.touch(user)
+        manager.avatars.prefetch(avatar)
     today = datetime.today()
     if account.sign_in and (today - account.sign_in).days == 0:
         return "你已经签过到了哦"
@@ -170,8 +176,9 @@ async def _(event: Event):
         lines.append(revolution_marking)
 
     info.append(
-        avatar_card(
-            await download_url(user.avatar_url),
+        Card(
+            avatar_card,
+            await manager.avatars.thumbnail(user.avatar_url, 260),
             account.name or user.name or user.id,
             lines,
         )
@@ -181,7 +188,7 @@ async def _(event: Event):
         if count := marking_prop.N(user, account):
             lines.append(f"[color][{marking_prop.color}]Lv.{min(count, 99)}[nowrap][passport]\n[pixel][160]{marking_prop.tip}")
     if lines:
-        info.append(text_to_image("\n".join(lines)))
+        info.append(Card(text_to_image, "\n".join(lines)))
     lines = []
     sum_std_n = user.bank[STD_GOLD.id]
     dist: list[tuple[int, str]] = [(sum_std_n, "个人账户")]
@@ -193,10 +200,10 @@ async def _(event: Event):
         sum_std_n += std_n
     lines.append(f"[color][#FFCC33]金币 {format_number(sum_std_n)}")
     lines.append(f"[color][#0066CC]股票 {format_number(manager.stock_value(user.invest))}")
-    info.append(text_to_image("\n".join(lines), 40, canvas=dist_card(dist)))
+    info.append(Card(text_to_image, "\n".join(lines), 40, canvas=Card(dist_card, dist)))
     data = manager.invest_data(user.invest)
     if data:
-        info.append(invest_card(data, "股票信息"))
+        info.append(Card(invest_card, data, "股票信息"))
     lines = []
     if account.sign_in is None:
         delta_days = 1
@@ -206,10 +213,12 @@ async def _(event: Event):
         lines.append("[color][green]本群今日已签到")
     else:
         lines.append(f"[color][red]本群连续{delta_days}天 未签到")
-    lines += user.message
-    info.append(text_to_image("\n".join(lines) + endline("Message"), 30, autowrap=True))
-    user.message.clear()
-    return manager.info_card(info, event.user_id)
+    if user.message:
+        lines += user.message
+        user.message.clear()
+        manager.data.touch(user)
+    info.append(Card(text_to_image, "\n".join(lines) + endline("Message"), 30, autowrap=True))
+    return await manager.info_card(info, event.user_id)
 
 
 @plugin.handle({"我的道具"}, {"user_id", "group_id", "nickname"})
@@ -223,10 +232,10 @@ async def _(event: Event):
 
     data = manager.props_data(props)
     if len(data) < 10 or event.single_arg() in {"信息", "介绍", "详情"}:
-        info = bank_card(data)
+        info = [Card(bank_card, data)]
     else:
-        info = [prop_card(data)]
-    return manager.info_card(info, event.user_id)
+        info = [Card(prop_card, data)]
+    return await manager.info_card(info, event.user_id)
 
 
 @plugin.handle({"股票查询", "投资查询"}, {"user_id", "group_id", "nickname"})
@@ -234,7 +243,7 @@ async def _(event: Event):
     user, account = manager.account(event)
     data = manager.invest_data(user.invest)
     if data:
-        return manager.info_card([invest_card(data, f"股票信息:{account.name}")], event.user_id)
+        return await manager.info_card([Card(invest_card, data, f"股票信息:{account.name}")], event.user_id)
     return "您的仓库空空如也。"
 
 
@@ -250,14 +259,16 @@ async def _(event: Event):
     group = manager.data.group(group_id)
     if command == "查看":
         data = manager.props_data(group.bank)
-        if len(data) < 6:
-            info = bank_card(data)
+        if not data:
+            info = []
+        elif len(data) < 6:
+            info = [Card(bank_card, data)]
         else:
-            info = [prop_card(data, "群金库")]
+            info = [Card(prop_card, data, "群金库")]
         data = manager.invest_data(group.invest)
         if data:
-            info.append(invest_card(data, "群投资"))
-        return manager.info_card(info, user_id) if info else "群金库是空的"
+            info.append(Card(invest_card, data, "群投资"))
+        return await manager.info_card(info, user_id) if info else "群金库是空的"
     sign, name = command[0], command[1:]
     match sign:
         case "存":
@@ -309,7 +320,7 @@ async def _(event: Event):
         f"等级 {group.level}",
         f"成员 {len(group.accounts_map)}",
     ]
-    info.append(avatar_card(await download_url(avatar_url) if (avatar_url := group.avatar_url) else None, group.nickname, lines))
+    info.append(Card(avatar_card, await manager.avatars.thumbnail(group.avatar_url, 260), group.nickname, lines))
     if ranklist := group.extra.get("revolution_achieve"):
         ranklist = list(ranklist.items())
         ranklist.sort(key=lambda x: x[1], reverse=True)
@@ -322,17 +333,18 @@ async def _(event: Event):
                 nickname = "已注销"
             return f"{nickname}[nowrap]\n[right]{n}次"
 
-        info.append(text_to_image("\n".join(result(*seg) for seg in ranklist[:10]) + endline("路灯挂件榜")))
-    if record := group.extra.get("stock_record"):
-        info.append(candlestick((9.5, 3), 12, record))
+        info.append(Card(text_to_image, "\n".join(result(*seg) for seg in ranklist[:10]) + endline("路灯挂件榜")))
+    if chart := await kline_chart(group):
+        info.append(chart)
     if data := manager.props_data(group.bank):
-        info.append(prop_card(data, "群金库"))
+        info.append(Card(prop_card, data, "群金库"))
     if data := manager.invest_data(group.invest):
-        info.append(invest_card(data, "群投资"))
+        info.append(Card(invest_card, data, "群投资"))
     if group.message:
-        info.append(text_to_image("\n".join(group.message) + endline("Message"), 30, autowrap=True))
+        info.append(Card(text_to_image, "\n".join(group.message) + endline("Message"), 30, autowrap=True))
         group.message.clear()
-    return manager.info_card(info, event.user_id)
+        manager.data.touch(group)
+    return await manager.info_card(info, event.user_id)
 
 
 # 超管指令
@@ -376,12 +388,12 @@ async def _(event: Event):
             manager.data.cancel_account(account_id)
         info = []
         if data := [(prop, v) for k, v in bank.items() if (prop := manager.props_library.get(k))]:
-            info.append(prop_card(data, "已删除道具"))
+            info.append(Card(prop_card, data, "已删除道具"))
         if data := [(stock, v) for k, v in user.invest.items() if (group := manager.group_library.get(k)) and (stock := group.stock)]:
-            info.append(invest_card(data, "已删除股票"))
+            info.append(Card(invest_card, data, "已删除股票"))
         user.invest.clear()
         if info:
-            return ["冻结完成", manager.info_card(info, user_id)]
+            return ["冻结完成", await manager.info_card(info, user_id)]
         return "冻结完成,目标没有任何资产"
 
     return f"您即将冻结 {account.name}（{user.id}），请输入{confirm}来确认。"
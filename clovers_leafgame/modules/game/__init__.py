@@ -22,7 +22,9 @@ async def _(event: Event):
     if session.at and session.at != user_id:
         return f"现在是 {session.p1_nickname} 发起的对决，请等待比赛结束后再开始下一轮..."
     user, account = manager.account(event)
-    user.connect = group_id
+    if user.connect != group_id:
+        user.connect = group_id
+        manager.data.touch(user)
     bet = session.bet
     if bet:
         prop, n = bet
@@ -1,12 +1,12 @@
 import time
 import asyncio
-from collections import Counter
 from collections.abc import Coroutine, Callable, Sequence
 from clovers.utils.tools import to_int
 from clovers_leafgame.main import manager
 from clovers_leafgame.item import Prop, GOLD
 from clovers_leafgame.output import text_to_image, endline
 from clovers_leafgame.core.clovers import Event
+from clovers_leafgame.core.render import Card
 from clovers.core.config import config as clovers_config
 from .config import Config
 
@@ -103,7 +103,7 @@ class Session:
     def settle(self):
         """
         游戏结束结算
-            return:结算界面
+            return:结算界面，资料卡在后台绘制
         """
         group_id = self.group_id
         win = self.win if self.win else self.p1_uid if self.next == self.p2_uid else self.p2_uid
@@ -119,27 +119,17 @@ class Session:
         bet = self.bet
         if bet:
             tip = manager.transfer(*bet, lose, win, group_id)
-            info = [text_to_image(tip + endline("结算"), autowrap=True)]
+            info = [Card(text_to_image, tip + endline("结算"), autowrap=True)]
         else:
             info = []
-        ranklist = manager.data.extra.setdefault("ranklist", {})
-        win_rank = ranklist["win"] = Counter(ranklist.get("win", {}))
-        win_rank[win] += 1
-        lose_rank = ranklist["lose"] = Counter(ranklist.get("lose", {}))
-        lose_rank[lose] += 1
-        win_achieve = ranklist["win_achieve"] = Counter(ranklist.get("win_achieve", {}))
-        win_achieve[win] += 1
-        win_achieve[lose] = 0
-        lose_achieve = ranklist["lose_achieve"] = Counter(ranklist.get("lose_achieve", {}))
-        lose_achieve[win] = 0
-        lose_achieve[lose] += 1
+        win_stats, lose_stats = manager.match_stats.record(self.game.name, win, lose)
         card = (
             f"[pixel][20]◆胜者 {win_name}[nowrap]\n[pixel][460]◇败者 {lose_name}\n"
-            f"[pixel][20]◆战绩 {win_rank[win]}:{lose_rank[win]}[nowrap]\n[pixel][460]◇战绩 {win_rank[lose]}:{lose_rank[lose]}\n"
-            f"[pixel][20]◆连胜 {win_achieve[win]}[nowrap]\n[pixel][460]◇连败 {lose_achieve[lose]}"
+            f"[pixel][20]◆战绩 {win_stats[0]}:{win_stats[1]}[nowrap]\n[pixel][460]◇战绩 {lose_stats[0]}:{lose_stats[1]}\n"
+            f"[pixel][20]◆连胜 {win_stats[2]}[nowrap]\n[pixel][460]◇连败 {lose_stats[3]}"
         )
-        info.insert(0, text_to_image(card + endline("对战")))
-        result = [f"这场对决是 {win_name} 胜利了", manager.info_card(info, win)]
+        info.insert(0, Card(text_to_image, card + endline("对战")))
+        result = [f"这场对决是 {win_name} 胜利了", asyncio.create_task(manager.info_card(info, win))]
         if self.end_tips:
             result.append(self.end_tips)
         return result
@@ -153,7 +143,7 @@ class Session:
                 yield result
                 await asyncio.sleep(1)
             for x in settle:
-                yield x
+                yield await x if isinstance(x, asyncio.Task) else x
                 await asyncio.sleep(1)
 
         return output()
@@ -203,7 +193,9 @@ class Game:
                 prop_name, n, arg = self.args_parse(event.args)
                 prop = manager.props_library.get(prop_name, GOLD)
                 user, account = manager.locate_account(user_id, group_id)
-                user.connect = group_id
+                if user.connect != group_id:
+                    user.connect = group_id
+                    manager.data.touch(user)
                 bank = prop.locate_bank(user, account)
                 if n < 0:
                     n = default_bet
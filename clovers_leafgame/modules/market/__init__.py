@@ -2,6 +2,8 @@ import time
 import heapq
 import math
 import random
+import asyncio
+import numpy as np
 from io import BytesIO
 from collections import Counter
 from clovers_apscheduler import scheduler
@@ -9,10 +11,13 @@ from clovers.utils.tools import gini_coef, format_number
 from clovers_leafgame.core.clovers import Event, Check
 from clovers_leafgame.core.data import Account, Group, Stock
 from clovers_leafgame.main import plugin, manager
+from clovers_leafgame.core.render import Card
 from clovers_leafgame.item import GOLD, LICENSE, STD_GOLD, REVOLUTION_MARKING, item_name_rule
-from clovers_leafgame.output import text_to_image, endline, invest_card, prop_card
+from clovers_leafgame.output import text_to_image, endline, invest_card, prop_card, kline_chart
+from clovers_leafgame.core import kline
 from clovers.core.config import config as clovers_config
 from .config import Config
+from . import core as market
 
 config_key = __package__
 config_data = Config.model_validate(clovers_config.get(config_key, {}))
@@ -26,6 +31,35 @@ revolt_cd = config_data.revolt_cd
 company_public_gold = config_data.company_public_gold
 
 
+def market_changed(field: str, bank: str, record, key: str, delta: int):
+    """市场信息用到的数据（群投资，群注销）变化时更新版本"""
+    if bank == "invest" or (field == "group_dict" and bank == "record"):
+        manager.render_cache.bump("market")
+
+
+manager.subscribe(market_changed)
+
+
+def record_cancelled(field: str, bank: str, record, key: str, delta: int):
+    """
+    注销后清理订单
+        群：删除订单簿（继承时买单已在注销前退还）
+        用户：撤销其全部订单，冻结的金币随用户的库存一起删除。回档时用户先注销再写入，以备份中的库存为准
+    """
+    if bank != "record" or delta > 0:
+        return
+    match field:
+        case "group_dict":
+            market.books.pop(key, None)
+        case "user_dict" if key not in manager.data.user_dict:
+            for group in manager.data.group_dict.values():
+                if (stock := group.stock) and market.order_book(stock).cancel(key):
+                    manager.data.touch_stock(group)
+
+
+manager.subscribe(record_cancelled)
+
+
 @plugin.handle({"发起重置"}, {"group_id"})
 async def _(event: Event):
     group_id = event.group_id
@@ -33,16 +67,13 @@ async def _(event: Event):
     revolution_time = group.extra.get("revolution_time", 0)
     if time.time() - revolution_time < revolt_cd:
         return f"重置正在冷却中，结束时间：{time.strftime('%H:%M:%S', time.localtime(revolution_time + revolt_cd))}"
+    if (sum_wealths := manager.member_wealth(group, GOLD.id)) < company_public_gold:
+        return f"本群金币（{sum_wealths}）小于{company_public_gold}，未满足重置条件。"
     ranklist: list[tuple[Account, int]] = []
-    sum_wealths = 0
     for account_id in group.accounts_map.values():
         account = manager.data.account_dict[account_id]
-        n = account.bank[GOLD.id]
-        if account.bank[GOLD.id] >= gini_filter_gold:
+        if (n := account.bank[GOLD.id]) >= gini_filter_gold:
             ranklist.append((account, n))
-        sum_wealths += n
-    if sum_wealths < company_public_gold:
-        return f"本群金币（{sum_wealths}）小于{company_public_gold}，未满足重置条件。"
     gini = gini_coef([x[1] for x in ranklist])
     if gini < revolt_gini:
         return f"当前基尼系数为{round(gini,3)}，未满足重置条件。"
@@ -50,26 +81,29 @@ async def _(event: Event):
     top = ranklist[0][0]
     REVOLUTION_MARKING.locate_bank(*manager.locate_account(top.user_id, group_id))[REVOLUTION_MARKING.id] += 1
     group.extra["revolution_time"] = time.time()
-    revolution_achieve: dict = group.extra.setdefault("revolution_achieve", {})
-    revolution_achieve[top.user_id] = revolution_achieve.get(top.user_id, 0) + 1
+    manager.match_stats.revolution(group, top.user_id)
     for i, (account, n) in enumerate(ranklist):
         account.bank[GOLD.id] = int(n * i / 10)
     for account_id in group.accounts_map.values():
-        manager.data.account_dict[account_id].extra["revolution"] = False
+        account = manager.data.account_dict[account_id]
+        account.extra["revolution"] = False
+        manager.data.touch(account)
     rate = group.level / group.level + 1
     for prop_id, n in group.bank.items():
         prop = manager.props_library[prop_id]
         if prop.domain == 1:
             group.bank[prop_id] = int(n * rate)
-    group.level += 1
+    manager.data.set_level(group, group.level + 1)
     return f"当前系数为：{round(gini,3)}，重置成功！恭喜{top.name}进入挂件榜☆！重置签到已刷新。"
 
 
 @plugin.handle({"重置签到", "领取金币"}, {"user_id", "group_id", "nickname", "avatar"})
 async def _(event: Event):
     user, account = manager.account(event)
-    if avatar := event.avatar:
+    if (avatar := event.avatar) and avatar != user.avatar_url:
         user.avatar_url = avatar
+        manager.data.touch(user)
+        manager.avatars.prefetch(avatar)
     extra = account.extra
     if not extra.setdefault("revolution", True):
         return "你没有待领取的金币"
@@ -147,8 +181,10 @@ async def _(event: Event):
 async def _(event: Event):
     group_id = event.group_id
     group = manager.data.group(group_id)
-    if group_avatar := event.group_avatar:
+    if (group_avatar := event.group_avatar) and group_avatar != group.avatar_url:
         group.avatar_url = group_avatar
+        manager.data.touch(group)
+        manager.avatars.prefetch(group_avatar)
     stock = group.stock
     if stock:
         return f"本群已在市场注册，注册名：{stock.name}"
@@ -166,7 +202,8 @@ async def _(event: Event):
     gini = gini_coef([x for x in wealths[:-1] if x >= gini_filter_gold])
     if gini > revolt_gini:
         return f"本群基尼系数（{round(gini,3)}）过高，注册失败。"
-    level = group.level = (sum(ra.values()) if (ra := group.extra.get("revolution_achieve")) else 0) + 1
+    level = (sum(ra.values()) if (ra := group.extra.get("revolution_achieve")) else 0) + 1
+    manager.data.set_level(group, level)
     group.bank[STD_GOLD.id] += gold * level
     group.bank[GOLD.id] = 0
     stock_value *= level
@@ -178,7 +215,9 @@ async def _(event: Event):
         issuance=20000 * level,
         time=time.time(),
     )
+    manager.prices.remove(stock.id)
     manager.group_library.set_item(group.id, {stock_name}, group)
+    manager.render_cache.bump("market")
     return f"{stock.name}发行成功，发行价格为{format_number(stock.value/ 20000)}金币"
 
 
@@ -198,10 +237,20 @@ async def _(event: Event):
         return f"本群仓库缺少【{LICENSE.name}】"
     old_name = stock.name
     stock.name = stock_name
+    manager.data.touch_stock(group)
     manager.group_library.set_item(group.id, {stock_name}, group)
+    manager.render_cache.bump("market")
     return f"【{old_name}】已重命名为【{stock_name}】"
 
 
+def buy_tip(reason: str | None, limit: float, gold: int):
+    match reason:
+        case "limit":
+            return f"价格超过限制（{limit}）。"
+        case "gold":
+            return f"你的金币不足（{gold}）。"
+
+
 @plugin.handle({"购买", "发行购买"}, {"user_id", "group_id", "nickname"})
 async def _(event: Event):
     if not (args := event.args_parse()):
@@ -216,31 +265,15 @@ async def _(event: Event):
     if (n := stock_group.bank[GOLD.id]) < company_public_gold:
         return f"本群金币过少（{n}<{company_public_gold}），无法完成结算"
     stock_level = stock_group.level
-    stock_value = sum(manager.group_wealths(stock.id, GOLD.id)) * stock_level + stock_group.bank[STD_GOLD.id]
+    stock_value = (manager.member_wealth(stock_group, GOLD.id) + stock_group.bank[GOLD.id]) * stock_level + stock_group.bank[STD_GOLD.id]
     user, account = manager.account(event)
     group = manager.data.group(account.group_id)
     level = group.level
     account_STD_GOLD = account.bank[GOLD.id] * level
     my_STD_GOLD = user.bank[STD_GOLD.id] + account_STD_GOLD
-    issuance = stock.issuance
-    floating = stock.floating
     limit = limit or float("inf")
-    value = 0.0
-    _buy = 0
-    for _ in range(buy):
-        unit = max(floating, stock_value) / issuance
-        if unit > limit:
-            tip = f"价格超过限制（{limit}）。"
-            break
-        value += unit
-        if value > my_STD_GOLD:
-            value -= unit
-            tip = f"你的金币不足（{my_STD_GOLD}）。"
-            break
-        floating += unit
-        _buy += 1
-    else:
-        tip = "交易成功！"
+    _buy, value, floating, reason = market.buy_quote(stock.floating, stock_value, stock.issuance, buy, limit, my_STD_GOLD)
+    tip = buy_tip(reason, limit, my_STD_GOLD) or "交易成功！"
 
     int_value = math.ceil(value)
     user.bank[STD_GOLD.id] -= int_value
@@ -254,15 +287,69 @@ async def _(event: Event):
     group.invest[stock.id] -= _buy
     stock.floating = floating
     stock.value = stock_value + int_value
+    manager.data.touch_stock(stock_group)
     output = BytesIO()
     text_to_image(
-        f"{stock.name}\n----" f"\n数量：{_buy}" f"\n单价：{round(value/_buy,2)}" f"\n总计：{int_value}" + endline(tip),
+        f"{stock.name}\n----" f"\n数量：{_buy}" f"\n单价：{round(value/_buy,2) if _buy else '-'}" f"\n总计：{int_value}" + endline(tip),
         width=440,
         bg_color="white",
     ).save(output, format="png")
     return output
 
 
+@plugin.handle({"购买预览", "询价"}, {"user_id", "group_id", "nickname"})
+async def _(event: Event):
+    if not (args := event.args_parse()):
+        return
+    stock_name, buy, limit = args
+    stock_group = manager.group_library.get(stock_name)
+    if not stock_group or not (stock := stock_group.stock):
+        return f"没有 {stock_name} 的注册信息"
+    buy = min(stock_group.invest[stock.id], buy)
+    if buy < 1:
+        return "已售空，请等待结算。"
+    stock_value = (manager.member_wealth(stock_group, GOLD.id) + stock_group.bank[GOLD.id]) * stock_group.level + stock_group.bank[STD_GOLD.id]
+    user, account = manager.account(event)
+    my_STD_GOLD = user.bank[STD_GOLD.id] + account.bank[GOLD.id] * manager.data.group(account.group_id).level
+    limit = limit or float("inf")
+    issuance = stock.issuance
+    n, value, floating, reason = market.buy_quote(stock.floating, stock_value, issuance, buy, limit, my_STD_GOLD)
+    tip = buy_tip(reason, limit, my_STD_GOLD) or "可以全部买入。"
+    output = BytesIO()
+    text_to_image(
+        f"{stock.name}\n----"
+        f"\n数量：{n}"
+        f"\n单价：{round(value/n,2) if n else '-'}"
+        f"\n总计：{math.ceil(value)}"
+        f"\n当前股价：{round(max(stock.floating, stock_value)/issuance,2)}"
+        f"\n买入后股价：{round(max(floating, stock_value)/issuance,2)}" + endline(tip),
+        width=440,
+        bg_color="white",
+    ).save(output, format="png")
+    return output
+
+
+def holding(stock: Stock):
+    """卖方当前持有的股票数量"""
+    return lambda user_id: manager.data.user(user_id).invest[stock.id]
+
+
+def deliver(stock: Stock, trades: list[market.Trade]):
+    """交付撮合成交的股票和金币，并通知双方"""
+    clock = time.strftime("%H:%M")
+    for seller_id, buyer_id, n, pay, refund in trades:
+        seller = manager.data.user(seller_id)
+        buyer = manager.data.user(buyer_id)
+        seller.invest[stock.id] -= n
+        buyer.invest[stock.id] += n
+        seller.bank[STD_GOLD.id] += pay
+        buyer.bank[STD_GOLD.id] += refund
+        seller.add_message(f"【交易市场 {clock}】{stock.name}卖出{n}份，收入{pay}标准金币。")
+        buyer.add_message(
+            f"【交易市场 {clock}】{stock.name}买入{n}份，花费{pay}标准金币。" + (f"\n买单已完成，退还{refund}标准金币。" if refund else "")
+        )
+
+
 @plugin.handle({"出售", "卖出", "结算"}, {"user_id"})
 async def _(event: Event):
     if not (args := event.args_parse()):
@@ -275,21 +362,66 @@ async def _(event: Event):
     stock_name = stock_group.nickname
     my_stock = min(user.invest[stock.id], n)
     user_id = user.id
-    exchange = stock.exchange
+    book = market.order_book(stock)
     if my_stock < 1:
-        if user_id in exchange:
-            del exchange[user_id]
+        if book.cancel_ask(user_id) is not None:
+            manager.data.touch_stock(stock_group)
             return "交易信息已注销。"
         else:
             return "交易信息无效。"
-    if user_id in exchange:
+    if user_id in stock.exchange:
         tip = "交易信息已修改。"
     else:
         tip = "交易信息发布成功！"
-    exchange[user_id] = (n, quote or 0.0)
+    if refund := book.cancel_bid(user_id):
+        user.bank[STD_GOLD.id] += refund
+        tip += f"\n你的买单已撤销，退还{refund}标准金币。"
+    book.ask(user_id, n, quote or 0.0)
+    trades = book.match(holding(stock))
+    deliver(stock, trades)
+    manager.data.touch_stock(stock_group)
+    output = BytesIO()
+    text_to_image(
+        f"{stock_name}\n----\n报价：{quote or '自动出售'}\n数量：{n}\n成交：{sum(trade[2] for trade in trades)}" + endline(tip),
+        width=440,
+        bg_color="white",
+    ).save(output, format="png")
+    return output
+
+
+@plugin.handle({"求购", "挂单购买"}, {"user_id"})
+async def _(event: Event):
+    if not (args := event.args_parse()):
+        return
+    stock_name, n, price = args
+    user = manager.data.user(event.user_id)
+    stock_group = manager.group_library.get(stock_name)
+    if not stock_group or not (stock := stock_group.stock):
+        return f"没有 {stock_name} 的注册信息"
+    stock_name = stock_group.nickname
+    user_id = user.id
+    book = market.order_book(stock)
+    if n < 1 or price <= 0:
+        if refund := book.cancel_bid(user_id):
+            user.bank[STD_GOLD.id] += refund
+            manager.data.touch_stock(stock_group)
+            return f"买单已撤销，退还{refund}标准金币。"
+        return "买单无效，请指定数量和单价。"
+    gold = math.ceil(n * price)
+    frozen = order[2] if (order := stock.bids.get(user_id)) else 0
+    if (my_STD_GOLD := user.bank[STD_GOLD.id] + frozen) < gold:
+        return f"你的标准金币不足（{my_STD_GOLD}<{gold}）。"
+    tip = "买单已修改。" if order else "买单发布成功！"
+    user.bank[STD_GOLD.id] += book.cancel_bid(user_id) - gold
+    if book.cancel_ask(user_id) is not None:
+        tip += "\n你的卖单已撤销。"
+    book.bid(user_id, n, price, gold)
+    trades = book.match(holding(stock))
+    deliver(stock, trades)
+    manager.data.touch_stock(stock_group)
     output = BytesIO()
     text_to_image(
-        f"{stock_name}\n----\n报价：{quote or '自动出售'}\n数量：{n}" + endline(tip),
+        f"{stock_name}\n----\n单价：{price}\n数量：{n}\n冻结：{gold}\n成交：{sum(trade[2] for trade in trades)}" + endline(tip),
         width=440,
         bg_color="white",
     ).save(output, format="png")
@@ -301,8 +433,32 @@ async def _(event: Event):
     data = [(stock, group.invest[stock.id]) for group in manager.data.group_dict.values() if (stock := group.stock)]
     if not data:
         return "市场为空"
-    data.sort(key=lambda x: x[0].value, reverse=True)
-    return manager.info_card([invest_card(data)], event.user_id)
+
+    async def render():
+        data.sort(key=lambda x: x[0].value, reverse=True)
+        return await manager.renderer.draw(Card(invest_card, data))
+
+    card = await manager.render_cache.get(("market", manager.render_cache.version("market")), render)
+    return await manager.info_card([card], event.user_id)
+
+
+@plugin.handle({"K线图", "股价走势"}, {"user_id", "group_id"})
+async def _(event: Event):
+    resolution = "1h"
+    group_name = None
+    for arg in event.args:
+        if arg in kline.RESOLUTIONS:
+            resolution = arg
+        else:
+            group_name = arg
+    if group_name:
+        if not (group := manager.group_library.get(group_name)):
+            return f"未找到【{group_name}】"
+    elif not (event.group_id and (group := manager.data.group_dict.get(event.group_id))):
+        return
+    if not (chart := await kline_chart(group, resolution)):
+        return f"{group.nickname}没有价格记录"
+    return await manager.info_card([chart], event.user_id)
 
 
 @plugin.handle({"继承公司账户", "继承群账户"}, {"user_id", "permission"})
@@ -331,9 +487,9 @@ async def _(event: Event):
     ExRate = deceased_group.level / heir_group.level
     # 继承群金库
     invest_group = Counter(deceased_group.invest)
-    heir_group.invest = Counter(heir_group.invest) + invest_group
+    heir_group.invest.update(invest_group)
     bank_group = Counter({k: int(v * ExRate) if manager.props_library[k].domain == 1 else v for k, v in deceased_group.bank.items()})
-    heir_group.bank = Counter(heir_group.bank) + bank_group
+    heir_group.bank.update(bank_group)
     # 继承群员账户
     all_bank_private = Counter()
     for deceased_user_id, deceased_account_id in deceased_group.accounts_map.items():
@@ -343,90 +499,89 @@ async def _(event: Event):
             all_bank_private += bank
             heir_account_id = heir_group.accounts_map[deceased_user_id]
             heir_account = manager.data.account_dict[heir_account_id]
-            heir_account.bank = Counter(heir_account.bank) + bank
+            heir_account.bank.update(bank)
         else:
             bank_group += bank
-            heir_group.bank = Counter(heir_group.bank) + bank
+            heir_group.bank.update(bank)
+    # 退还被继承群股票的买单
+    if stock := deceased_group.stock:
+        for user_id, gold in market.close(stock):
+            manager.data.user(user_id).bank[STD_GOLD.id] += gold
     del manager.group_library[deceased_group.id]
     manager.data.cancel_group(deceased_group.id)
+    manager.prices.remove(deceased_group.id)
     info = []
-    info.append(invest_card(manager.invest_data(invest_group), "群投资继承"))
-    info.append(prop_card(manager.props_data(bank_group), "群金库继承"))
-    info.append(prop_card(manager.props_data(all_bank_private), "个人总继承"))
-    return manager.info_card(info, event.user_id)
+    info.append(Card(invest_card, manager.invest_data(invest_group), "群投资继承"))
+    info.append(Card(prop_card, manager.props_data(bank_group), "群金库继承"))
+    info.append(Card(prop_card, manager.props_data(all_bank_private), "个人总继承"))
+    return await manager.info_card(info, event.user_id)
 
 
 @plugin.handle({"刷新市场"}, {"permission"})
 @Check().superuser().check
 @scheduler.scheduled_job("cron", minute="*/5", misfire_grace_time=120)
 async def _():
-    def stock_update(group: Group):
-        stock = group.stock
-        if not stock:
-            return f"{group.id} 更新失败"
-        level = group.level
-        # 资产更新
-        wealths = manager.group_wealths(group.id, GOLD.id)
-        stock_value = stock.value = sum(wealths) * level + group.bank[STD_GOLD.id]
-        floating = stock.floating
-        if not floating or math.isnan(floating):
-            stock.floating = float(stock_value)
-            return f"{stock.name} 已初始化"
-        # 股票价格变化：趋势性影响（正态分布），随机性影响（平均分布），向债务价值回归
-        floating += floating * random.gauss(0, 0.03)
-        floating += stock_value * random.uniform(-0.1, 0.1)
-        floating += (stock_value - floating) * 0.05
-        # 股票浮动收入
-        group.bank[GOLD.id] = int(wealths[-1] * floating / stock.floating)
-        # 结算交易市场上的股票
-        issuance = stock.issuance
-        std_value = 0
+    def stock_update(groups: list[Group]):
         now_time = time.time()
         clock = time.strftime("%H:%M", time.localtime(now_time))
-        for user_id, exchange in stock.exchange.items():
-            user = manager.data.user(user_id)
-            n, quote = exchange
-            value = 0.0
-            settle = 0
-            if quote:
-                for _ in range(n):
-                    unit = floating / issuance
-                    if unit < quote:
-                        break
-                    value += quote
-                    floating -= quote
-                    settle += 1
-            else:
-                for _ in range(n):
-                    unit = max(floating / issuance, 0.0)
-                    value += unit
-                    floating -= unit
-                settle = n
-            if settle == 0:
+        # 资产更新
+        golds = []
+        for group in groups:
+            gold = group.bank[GOLD.id]
+            group.stock.value = (manager.member_wealth(group, GOLD.id) + gold) * group.level + group.bank[STD_GOLD.id]
+            golds.append(gold)
+        value = np.array([group.stock.value for group in groups], dtype=float)
+        floating = np.array([group.stock.floating for group in groups], dtype=float)
+        initialized = (floating != 0) & ~np.isnan(floating)
+        floating = market.tick(value, floating)
+        log = []
+        for group, gold, floating, initialized in zip(groups, golds, floating.tolist(), initialized.tolist()):
+            stock = group.stock
+            if not initialized:
+                stock.floating = float(stock.value)
+                manager.data.touch_stock(group)
+                log.append(f"{stock.name} 已初始化")
                 continue
-            elif settle < n:
-                stock.exchange[user_id] = (n - settle, quote)
+            # 股票浮动收入
+            group.bank[GOLD.id] = int(gold * floating / stock.floating)
+            # 结算交易市场上的股票
+            issuance = stock.issuance
+            if stock.exchange:
+                floating, settled = market.order_book(stock).settle(floating, holding(stock))
             else:
-                stock.exchange[user_id] = (0, 0)
-            user.invest[stock.id] -= settle
-            group.invest[stock.id] += settle
-            int_value = int(value)
-            user.bank[STD_GOLD.id] += int_value
-            user.message.append(
-                f"【交易市场 {clock}】收入{int_value}标准金币。\n{stock.name}已出售{settle}/{n}，报价{quote or format_number(value/settle)}。"
-            )
-            std_value += value
-        group.bank[GOLD.id] -= int(std_value / level)
-        stock.exchange = {user_id: exchange for user_id, exchange in stock.exchange.items() if exchange[0] > 0}
-        # 更新浮动价格
-        stock.floating = floating
-        # 记录价格历史
-        if not (stock_record := group.extra.get("stock_record")):
-            stock_record = [(0.0, 0.0) for _ in range(720)]
-        stock_record.append((now_time, floating / issuance))
-        stock_record = stock_record[-720:]
-        group.extra["stock_record"] = stock_record
-        return f"{stock.name} 更新成功！"
-
-    groups = (group for group in manager.data.group_dict.values() if group.stock and group.stock.issuance)
-    print("\n".join(stock_update(group) for group in groups))
+                settled = []
+            std_value = 0
+            for user_id, n, quote, settle, value in settled:
+                user = manager.data.user(user_id)
+                user.invest[stock.id] -= settle
+                group.invest[stock.id] += settle
+                int_value = int(value)
+                user.bank[STD_GOLD.id] += int_value
+                user.message.append(
+                    f"【交易市场 {clock}】收入{int_value}标准金币。\n{stock.name}已出售{settle}/{n}，报价{quote or format_number(value/settle)}。"
+                )
+                std_value += value
+            group.bank[GOLD.id] -= int(std_value / group.level)
+            # 更新浮动价格
+            stock.floating = floating
+            manager.data.touch_stock(group)
+            # 记录价格历史
+            manager.prices.record(stock.id, now_time, floating / issuance)
+            log.append(f"{stock.name} 更新成功！")
+        return log
+
+    groups = [group for group in manager.data.group_dict.values() if group.stock and group.stock.issuance]
+    log = []
+    for i in range(0, len(groups), market.CHUNK):
+        # 跳过在让出事件循环期间被注销（或数据被重新读取）的群
+        group_dict = manager.data.group_dict
+        if chunk := [group for group in groups[i : i + market.CHUNK] if group_dict.get(group.id) is group]:
+            log += stock_update(chunk)
+        await asyncio.sleep(0)
+    print("\n".join(log))
+    manager.render_cache.bump("market")
+    # 在渲染进程中逐个重新绘制仍在缓存中（近期有人查看）的K线图
+    viewed = {key[0] for key in manager.chart_cache.images}
+    for group in groups:
+        if group.id in viewed and manager.data.group_dict.get(group.id) is group:
+            await kline_chart(group)
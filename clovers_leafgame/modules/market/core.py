@@ -0,0 +1,321 @@
+import sys
+import math
+import heapq
+import itertools
+import numpy as np
+from collections import Counter
+from collections.abc import Callable
+from clovers_leafgame.core.data import Stock
+
+CHUNK = 64
+"""每批更新的公司数，批次之间让出事件循环"""
+
+rng = np.random.default_rng()
+
+
+def tick(value: np.ndarray, floating: np.ndarray) -> np.ndarray:
+    """
+    一批公司的股票价格变化
+        趋势性影响（正态分布），随机性影响（平均分布），向债务价值回归
+        value:公司价值
+        floating:浮动价格
+    """
+    n = len(floating)
+    floating = floating + floating * rng.normal(0, 0.03, n)
+    floating += value * rng.uniform(-0.1, 0.1, n)
+    floating += (value - floating) * 0.05
+    return floating
+
+
+def repeat_add(s: float, step: float, n: int, stop: Callable[[float], bool] | None = None):
+    """
+    逐次执行 s += step 最多 n 次，结果与浮点数逐次相加完全相同
+        s 与相加结果在同一个二进制数量级内时每次的舍入相同，增量固定，按数量级成段计算
+        stop:每次相加前检查，为真时停止，须随相加次数单调（一旦为真之后都为真）
+        return:(s, 相加次数)
+    """
+    count = 0
+    while count < n and not (stop and stop(s)):
+        s1 = s + step
+        if s1 == s:
+            # 增量被舍入为 0，之后不再变化
+            return s, n
+        m = 1
+        if abs(s) >= sys.float_info.min and math.isfinite(s1) and (s > 0) == (s1 > 0):
+            # 以 ulp 为单位，同一数量级的数在 [2^52, 2^53) 之间
+            ulp = math.ulp(s)
+            S = int(abs(s) / ulp)
+            D = int(abs(s1) / ulp) - S
+            if 1 << 52 < S + D < 1 << 53:
+                # 增量固定需要下一次相加的结果也在数量级内部（离边界至少 1 ulp）
+                limit = ((1 << 53) - S - 1) // D if D > 0 else (S - (1 << 52) - 1) // -D
+                d = s1 - s
+                if limit >= 2 and (s1 + step) - s1 == d:
+                    m = min(limit, n - count)
+        if m == 1:
+            s = s1
+            count += 1
+            continue
+        if stop and stop(s + m * d):
+            lo, hi = 0, m
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if stop(s + mid * d):
+                    hi = mid
+                else:
+                    lo = mid
+            m = hi
+        s += m * d
+        count += m
+    return s, count
+
+
+def settle(floating: float, issuance: int, n: int, quote: float):
+    """
+    结算一笔出售，结果与逐份结算相同
+        quote:报价，为 0 时按市场价格全部出售
+        每份按报价出售时浮动价格减少报价（等差），直到市场价格低于报价
+        自动出售时每份按市场价格出售，浮动价格乘以 1 - 1/发行量（等比）
+        return:(结算后的浮动价格, 出售数量, 收入)
+    """
+    if n <= 0:
+        return floating, 0, 0.0
+    if quote:
+        floating, settle = repeat_add(floating, -quote, n, lambda floating: floating / issuance < quote)
+        value, _ = repeat_add(0.0, quote, settle)
+        return floating, settle, value
+    if floating <= 0 or issuance <= 1:
+        return sell_all(floating, issuance, n)
+    x = n * math.log1p(-1 / issuance)
+    value = floating * -math.expm1(x)
+    # 逐份结算时浮动价格与收入之和每份的舍入误差不超过 ε/2 floating，浮动价格的相对误差不超过 n ε/2 (1 + 1/(发行量 - 1))
+    # 收入取整可能与逐份结算不同时逐份结算
+    error = (n * (1 + math.exp(x) * issuance / (issuance - 1)) + 16) * sys.float_info.epsilon / 2 * floating
+    if math.floor(value - error) != math.floor(value + error):
+        return sell_all(floating, issuance, n)
+    return floating - value, n, value
+
+
+def sell_all(floating: float, issuance: int, n: int):
+    """逐份按市场价格出售"""
+    value = 0.0
+    for _ in range(n):
+        unit = max(floating / issuance, 0.0)
+        value += unit
+        floating -= unit
+        if not unit:
+            break
+    return floating, n, value
+
+
+def buy_cost(floating: float, value: float, issuance: int, n: int):
+    """
+    买入 n 份的总价
+        每份单价为 max(浮动价格, 公司价值) / 发行量，买入后浮动价格增加单价
+        浮动价格低于公司价值时单价不变（等差），之后每份使浮动价格乘以 1 + 1/发行量（等比）
+        return:(总价, 买入后的浮动价格)
+    """
+    cost = 0.0
+    if n > 0 and floating < value:
+        step = value / issuance
+        k = n if step <= 0 else min(n, math.ceil((value - floating) / step))
+        cost = k * step
+        floating += cost
+        n -= k
+    if n > 0:
+        try:
+            growth = math.expm1(n * math.log1p(1 / issuance)) * floating
+        except OverflowError:
+            growth = math.copysign(math.inf, floating) if floating else 0.0
+        cost += growth
+        floating += growth
+    return cost, floating
+
+
+def buy_quote(floating: float, value: float, issuance: int, n: int, limit: float, gold: float):
+    """
+    购买报价
+        单价随买入数量单调不减，二分查找不超过最高单价与金币上限的最大数量
+        return:(数量, 总价, 买入后的浮动价格, 未能全部买入的原因 limit/gold/None)
+    """
+
+    def unit(m: int):
+        """第 m + 1 份的单价"""
+        return max(buy_cost(floating, value, issuance, m)[1], value) / issuance
+
+    def allowed(m: int):
+        return m == 0 or (unit(m - 1) <= limit and buy_cost(floating, value, issuance, m)[0] <= gold)
+
+    lo = n
+    if not allowed(n):
+        lo, hi = 0, n
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if allowed(mid):
+                lo = mid
+            else:
+                hi = mid
+    cost, after = buy_cost(floating, value, issuance, lo)
+    if lo == n:
+        reason = None
+    elif max(after, value) / issuance > limit:
+        reason = "limit"
+    else:
+        reason = "gold"
+    return lo, cost, after, reason
+
+
+type Trade = tuple[str, str, int, int, int]
+"""成交：(卖方, 买方, 数量, 成交金额, 买单结束时退还的冻结金币)"""
+
+
+class OrderBook:
+    """
+    订单簿
+        卖单保存在 stock.exchange：user_id -> (数量, 报价)，报价为 0 时为自动出售
+        买单保存在 stock.bids：user_id -> (数量, 单价, 冻结的标准金币)
+        字典顺序即提交顺序，修改后由 DataBase.touch_stock 标记群并把股票写入日志。
+        asks/bids 是按 (价格, 提交序号) 排列的堆，卖单报价低者优先，买单单价高者优先，
+        撤单只删除字典中的订单，堆中的失效条目在到达堆顶时丢弃
+    """
+
+    counter = itertools.count()
+
+    def __init__(self, stock: Stock) -> None:
+        self.stock = stock
+        self.ask_seq: dict[str, int] = {}
+        self.bid_seq: dict[str, int] = {}
+        self.asks: list[tuple[float, int, str]] = []
+        self.bids: list[tuple[float, int, str]] = []
+        for user_id, (_, quote) in stock.exchange.items():
+            self.asks.append((quote, self.enter(self.ask_seq, user_id), user_id))
+        for user_id, (_, price, _) in stock.bids.items():
+            self.bids.append((-price, self.enter(self.bid_seq, user_id), user_id))
+        heapq.heapify(self.asks)
+        heapq.heapify(self.bids)
+
+    def enter(self, seqs: dict[str, int], user_id: str):
+        seq = seqs[user_id] = next(self.counter)
+        return seq
+
+    @staticmethod
+    def top(heap: list[tuple[float, int, str]], seqs: dict[str, int]):
+        """堆顶的有效订单，丢弃已撤销或已修改的条目"""
+        while heap:
+            _, seq, user_id = heap[0]
+            if seqs.get(user_id) == seq:
+                return user_id
+            heapq.heappop(heap)
+
+    def ask(self, user_id: str, n: int, quote: float):
+        """挂卖单，已有的卖单被替换并失去时间优先"""
+        self.cancel_ask(user_id)
+        self.stock.exchange[user_id] = (n, quote)
+        heapq.heappush(self.asks, (quote, self.enter(self.ask_seq, user_id), user_id))
+
+    def bid(self, user_id: str, n: int, price: float, gold: int):
+        """挂买单，已有的买单须先撤销"""
+        self.stock.bids[user_id] = (n, price, gold)
+        heapq.heappush(self.bids, (-price, self.enter(self.bid_seq, user_id), user_id))
+
+    def cancel_ask(self, user_id: str):
+        self.ask_seq.pop(user_id, None)
+        return self.stock.exchange.pop(user_id, None)
+
+    def cancel(self, user_id: str):
+        """撤销用户的全部订单（冻结的金币不退还），返回是否有订单被撤销"""
+        found = user_id in self.stock.exchange or user_id in self.stock.bids
+        self.cancel_ask(user_id)
+        self.cancel_bid(user_id)
+        return found
+
+    def cancel_bid(self, user_id: str):
+        """撤销买单，返回应退还的冻结金币"""
+        self.bid_seq.pop(user_id, None)
+        if (order := self.stock.bids.pop(user_id, None)) is None:
+            return 0
+        return order[2]
+
+    def best_ask(self):
+        return self.top(self.asks, self.ask_seq)
+
+    def match(self, holding: Callable[[str], int]):
+        """
+        撮合买卖单直到不再成交
+            holding:卖方当前持有的数量，卖单数量超出持有时按持有数量成交，没有持有时撤销
+            成交价为先提交的订单的价格，自动出售的卖单按买单单价成交
+        """
+        trades: list[Trade] = []
+        sold: Counter[str] = Counter()
+        exchange = self.stock.exchange
+        bids = self.stock.bids
+        while (seller := self.best_ask()) is not None and (buyer := self.top(self.bids, self.bid_seq)) is not None:
+            n, quote = exchange[seller]
+            m, bid_price, gold = bids[buyer]
+            if quote > bid_price:
+                break
+            if (k := min(n, m, holding(seller) - sold[seller])) <= 0:
+                self.cancel_ask(seller)
+                continue
+            sold[seller] += k
+            price = quote if quote and self.ask_seq[seller] < self.bid_seq[buyer] else bid_price
+            pay = min(math.ceil(k * price), gold)
+            gold -= pay
+            if k < n:
+                exchange[seller] = (n - k, quote)
+            else:
+                self.cancel_ask(seller)
+            if k < m:
+                bids[buyer] = (m - k, bid_price, gold)
+                refund = 0
+            else:
+                self.cancel_bid(buyer)
+                refund = gold
+            trades.append((seller, buyer, k, pay, refund))
+        return trades
+
+    def settle(self, floating: float, holding: Callable[[str], int]):
+        """
+        与公司结算卖单：按报价从低到高依次结算，遇到不能全部出售的卖单时停止（之后的报价更高）
+            return:(结算后的浮动价格, [(卖方, 原数量, 报价, 出售数量, 收入)])
+        """
+        issuance = self.stock.issuance
+        exchange = self.stock.exchange
+        result = []
+        while (user_id := self.best_ask()) is not None:
+            n, quote = exchange[user_id]
+            if (k := min(n, holding(user_id))) <= 0:
+                self.cancel_ask(user_id)
+                continue
+            floating, settle_n, value = settle(floating, issuance, k, quote)
+            if settle_n:
+                result.append((user_id, n, quote, settle_n, value))
+            if settle_n == k:
+                self.cancel_ask(user_id)
+                continue
+            if settle_n:
+                exchange[user_id] = (n - settle_n, quote)
+            break
+        return floating, result
+
+
+books: dict[str, OrderBook] = {}
+
+
+def order_book(stock: Stock):
+    """股票的订单簿，股票对象被替换（重新注册，重新读取存档）后重建"""
+    if (book := books.get(stock.id)) is None or book.stock is not stock:
+        book = books[stock.id] = OrderBook(stock)
+    return book
+
+
+def close(stock: Stock):
+    """
+    注销股票：删除订单簿并撤销全部订单
+        return:应退还的冻结金币 [(买方, 金币)]
+    """
+    books.pop(stock.id, None)
+    refunds = [(user_id, gold) for user_id, (_, _, gold) in stock.bids.items() if gold]
+    stock.exchange.clear()
+    stock.bids.clear()
+    return refunds
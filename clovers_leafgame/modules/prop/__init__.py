@@ -5,11 +5,12 @@ from datetime import datetime, timedelta
 from collections import Counter
 from clovers.core.plugin import Plugin
 from clovers_leafgame.core.clovers import Event, Check
+from clovers_leafgame.core.data import User
 from clovers_leafgame.main import plugin, manager
+from clovers_leafgame.core.render import Card
 from clovers_leafgame.item import Prop, GOLD, STD_GOLD
 from .core import usage, gacha, AIR_PACK, RED_PACKET
-from clovers_leafgame.output import prop_card, bank_card
-from .output import report_card
+from clovers_leafgame.output import prop_card, bank_card, report_card
 
 from clovers.core.config import config as clovers_config
 from .config import Config
@@ -53,20 +54,20 @@ async def _(event: Event):
     if count < 10:
         return "你获得了" + "\n".join(f"({prop.rare}☆){prop.name}:{n}个" for seg in prop_data for prop, n in seg)
     else:
-        info = [report_card(account.name, **report_data)]
+        info = [Card(report_card, account.name, **report_data)]
         if report_data["prop_n"] == 0:
             AIR_PACK.deal(user.bank, 1)
             RED_PACKET.deal(account.bank, 10)
             GOLD.deal(account.bank, gold)
-            info.append(prop_card([(AIR_PACK, 1), (GOLD, gold), (RED_PACKET, 10)], f"本次抽卡已免费"))
+            info.append(Card(prop_card, [(AIR_PACK, 1), (GOLD, gold), (RED_PACKET, 10)], f"本次抽卡已免费"))
         if data := prop_data[2]:
-            info.append(prop_card(data, "全局道具"))
+            info.append(Card(prop_card, data, "全局道具"))
         if data := prop_data[1]:
-            info.append(prop_card(data, "群内道具"))
+            info.append(Card(prop_card, data, "群内道具"))
         if data := prop_data[0]:
-            info.append(prop_card(data, "未获取"))
+            info.append(Card(prop_card, data, "未获取"))
 
-    return manager.info_card(info, user.id)
+    return await manager.info_card(info, user.id)
 
 
 @usage("金币", {"user_id", "group_id", "nickname"})
@@ -105,7 +106,7 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
         return f"使用失败，你没有足够的{prop.name}（{n}）"
     data = [(prop, count) for prop in manager.props_library.values() if prop.domain == 0]
     bank += {prop.id: n for prop, n in data}
-    return ["你获得了", manager.info_card(bank_card(data), user.id)]
+    return ["你获得了", await manager.info_card([Card(bank_card, data)], user.id)]
 
 
 @usage("随机红包", {"user_id", "group_id", "nickname"})
@@ -131,7 +132,7 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
         user.add_message(f"【{prop.name}】你在群内的欠款（{-std_n}枚标准金币）已转移到个人账户")
     data = manager.props_data(bank)
     manager.data.cancel_account(account.id)
-    return ["你在本群的账户已重置，祝你好运~", manager.info_card([prop_card(data, "账户已重置")], user.id)]
+    return ["你在本群的账户已重置，祝你好运~", await manager.info_card([Card(prop_card, data, "账户已重置")], user.id)]
 
 
 @usage("幸运硬币", {"user_id", "group_id", "nickname", "Bot_Nickname"})
@@ -205,7 +206,9 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
     if bank[prop.id] < 1:
         return f"使用失败，你未持有{prop.name}"
     group_id = event.group_id
-    folders = {f.name: f for f in manager.backup_path.iterdir() if f.is_dir()}
+    folders: dict[str, dict] = {}
+    for point in manager.backups.points():
+        folders.setdefault(point.time.strftime("%Y-%m-%d"), {})[point.time.strftime("%H:%M:%S")] = point
     tip = "请输入你要回档的日期:\n" + "\n".join(folders.keys())
     key = f"{user_id} {group_id}"
 
@@ -213,10 +216,9 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
     @Check().locate(user_id, group_id).check
     async def _(event: Event, finish):
         date = event.raw_command
-        folder = folders.get(date)
-        if not folder:
+        files = folders.get(date)
+        if not files:
             return tip
-        files = {f.stem.split()[1].replace("-", ":"): f for f in folder.iterdir() if f.is_file()}
         tip2 = "请输入你要回档的时间:\n" + "\n".join(files.keys())
         finish()
 
@@ -224,15 +226,17 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
         @Check().locate(user_id, group_id).check
         async def _(event: Event, finish):
             clock = event.raw_command
-            file = files.get(clock)
-            if not file:
+            point = files.get(clock)
+            if not point:
                 return tip2
+            user, accounts = await asyncio.to_thread(manager.backups.load_user, point, user_id)
             manager.data.cancel_user(user_id)
-            old_data = manager.data.load(file)
-            user = manager.data.user_dict[user_id] = old_data.user(user_id)
+            user = user or User(id=user_id)
+            manager.data.set_user(user)
             user.bank[prop.id] = bank[prop.id] - 1
-            for account_id in user.accounts_map.values():
-                manager.data.register(old_data.account_dict[account_id])
+            for account in accounts:
+                manager.data.register(account)
+            await manager.async_save()
             finish()
             return f"你已经回档到{date} {clock}"
 
@@ -295,7 +299,7 @@ async def _(prop: Prop, event: Event, count: int, extra: str):
                         counter += account.bank
                     user.bank[STD_GOLD.id] += manager.stock_value(user.invest) * 10
 
-                    yield ["这是你获得的道具", manager.info_card([prop_card(manager.props_data(counter))], user_id)]
+                    yield ["这是你获得的道具", await manager.info_card([Card(prop_card, manager.props_data(counter))], user_id)]
 
             return result()
 
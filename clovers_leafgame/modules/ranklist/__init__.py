@@ -1,93 +1,105 @@
-import heapq
 import asyncio
-from collections import Counter
-from collections.abc import Callable
 from clovers_leafgame.core.clovers import Event
+from clovers_leafgame.core.data import Group
+from clovers_leafgame.core.rank import RankIndex
+from clovers_leafgame.core.render import Card
+from clovers_leafgame.core.stats import TOTAL
 from clovers_leafgame.main import plugin, manager
-from clovers.utils.tools import download_url
-from .output import draw_rank
-
-
-def rank_title(title) -> Callable[[str], int] | None:
-    match title:
-        case "胜场":
-            return lambda locate_id: manager.data.extra.setdefault("win", Counter())[locate_id]
-        case "连胜":
-            return lambda locate_id: manager.data.extra.setdefault("win_achieve", Counter())[locate_id]
-        case "败场":
-            return lambda locate_id: manager.data.extra.setdefault("lose", Counter())[locate_id]
-        case "连败":
-            return lambda locate_id: manager.data.extra.setdefault("lose_achieve", Counter())[locate_id]
-
-
-def all_ranklist(title: str):
-    """总排名"""
-    prop = manager.props_library.get(title)
-    if not prop:
-        return
+from clovers_leafgame.output import draw_rank
+from .ranking import Ranking
+
+
+STAT_TITLES = {"胜场": "win", "败场": "lose", "连胜": "win_achieve", "连败": "lose_achieve"}
+
+
+def rank_title(title: str) -> RankIndex | None:
+    """对局统计排名，标题前可以加游戏名"""
+    if title.startswith("路灯挂件"):
+        return manager.match_stats.revolution_ranking()
+    for stat_title, stat in STAT_TITLES.items():
+        if title.endswith(stat_title):
+            return manager.match_stats.ranking(title[: -len(stat_title)] or TOTAL, stat)
+
+
+ranking = Ranking(manager)
+
+
+def user_ranklist(index: RankIndex):
+    """总排名：前 20 名 (昵称, 数量, 头像)，跳过已注销的用户"""
     ranklist = []
-    if prop.domain == 1:
-        prop_num = lambda account_id, prop_id: manager.data.account_dict[account_id].bank[prop_id]
-        group_level = lambda group_id: manager.data.group(group_id).level
-        std_value = lambda prop_id, group_id, account_id: prop_num(account_id, prop_id) * group_level(group_id)
-        value = lambda prop_id: sum(std_value(prop_id, *args) for args in user.accounts_map.items())
-    else:
-        value = lambda prop_id: user.bank[prop_id]
-    for user_id in manager.data.user_dict.keys():
-        user = manager.data.user(user_id)
-        ranklist.append((user.name or user_id, value(prop.id), user.avatar_url))
+    for user_id, value in index:
+        if user := manager.data.user_dict.get(user_id):
+            ranklist.append((user.name or user_id, value, user.avatar_url))
+            if len(ranklist) == 20:
+                break
     return ranklist
 
 
-def group_ranklist(title: str, group_id: str):
-    """群内排名"""
-    prop = manager.props_library.get(title)
-    if not prop:
-        return
-    group = manager.data.group_dict[group_id]
+def group_ranklist(index: RankIndex, group: Group):
+    """群内排名：前 20 名 (昵称, 数量, 头像)"""
     ranklist = []
-    for user_id in group.accounts_map.keys():
-        user, account = manager.locate_account(user_id, group_id)
-        ranklist.append((account.name or user.name or user_id, prop.N(user, account), user.avatar_url))
+    for user_id, value in index.top(20):
+        user = manager.data.user_dict[user_id]
+        account = manager.data.account_dict[group.accounts_map[user_id]]
+        ranklist.append((account.name or user.name or user_id, value, user.avatar_url))
     return ranklist
 
 
 @plugin.handle(r"^(.+)排行(.*)", {"user_id", "group_id", "to_me"})
 async def _(event: Event):
     title = event.args[0]
-    if title.startswith("路灯挂件"):
-        counter = Counter()
-        for group in manager.data.group_dict.values():
-            if not (revolution_achieve := group.extra.get("revolution_achieve")):
-                continue
-            counter.update(revolution_achieve)
-        ranklist = []
-        for user_id, value in counter.items():
-            user = manager.data.user(user_id)
-            ranklist.append((user.name or user_id, value, user.avatar_url))
-    elif value := rank_title(title):
-        ranklist = []
-        for user_id in manager.data.user_dict.keys():
-            user = manager.data.user(user_id)
-            ranklist.append((user.name or user_id, value(user_id), user.avatar_url))
+    if (index := rank_title(title)) is not None:
+        scope = ""
+        ranklist = lambda: user_ranklist(index)
     elif title.endswith("总"):
-        ranklist = all_ranklist(title[:-1])
+        if prop := manager.props_library.get(title[:-1]):
+            index = ranking.global_ranking(prop)
+        scope = ""
+        ranklist = lambda: user_ranklist(index)
     else:
         group_name = event.args[1] or event.group_id or manager.data.user(event.user_id).connect
         group = manager.group_library.get(group_name)
-        group_id = group.id if group else None
-        if not group_id:
+        if not group:
             return
-        ranklist = group_ranklist(title, group_id)
-    if not ranklist:
+        if prop := manager.props_library.get(title):
+            index = ranking.group_ranking(prop, group.id)
+        scope = group.id
+        ranklist = lambda: group_ranklist(index, group)
+    if not index:
         return f"无数据，无法进行{title}排行" if event.to_me else None
-    ranklist = heapq.nlargest(20, ranklist, key=lambda x: x[1])
-    nickname_data = []
-    rank_data = []
-    task_list = []
-    for nickname, v, avatar_url in ranklist[:20]:
-        nickname_data.append(nickname)
-        rank_data.append(v)
-        task_list.append(download_url(avatar_url))
-    avatar_data = await asyncio.gather(*task_list)
-    return manager.info_card([draw_rank(list(zip(nickname_data, rank_data, avatar_data)))], event.user_id)
+
+    async def render():
+        data = ranklist()
+        avatars = await asyncio.gather(*(manager.avatars.thumbnail(avatar_url, 60) for _, _, avatar_url in data))
+        return await manager.renderer.draw(Card(draw_rank, [(nickname, v, avatar) for (nickname, v, _), avatar in zip(data, avatars)]))
+
+    card = await manager.render_cache.get(("rank", title, scope, id(index), index.version), render)
+    return await manager.info_card([card], event.user_id)
+
+
+@plugin.handle({"我的排名"}, {"user_id", "group_id"})
+async def _(event: Event):
+    title = event.single_arg() or "金币"
+    user_id = event.user_id
+    if (index := rank_title(title)) is not None:
+        name = title
+        scope = ""
+    else:
+        if is_global := title.endswith("总"):
+            title = title[:-1]
+        prop = manager.props_library.get(title)
+        if not prop:
+            return f"没有【{title}】这种道具"
+        name = prop.name
+        if is_global:
+            index = ranking.global_ranking(prop)
+            scope = "总"
+        else:
+            group_id = event.group_id or manager.data.user(user_id).connect
+            if not group_id:
+                return
+            index = ranking.group_ranking(prop, group_id)
+            scope = "群内"
+    if not (rank := index.rank(user_id)):
+        return f"你的{name}为 0，未上榜"
+    return f"你的{name}{scope}排名：第 {rank} 名（共 {len(index)} 人）\n数量：{index[user_id]}"
@@ -0,0 +1,90 @@
+from clovers_leafgame.core.data import Prop, User, Group, Account
+from clovers_leafgame.core.rank import RankIndex
+from clovers_leafgame.manager import Manager
+
+
+class Ranking:
+    """
+    道具排名
+        总排名：每个用户的道具数，群内道具按群等级折算后求和
+        群内排名：每个群成员的道具数
+    索引在首次查询时扫描建立，之后订阅库存变化，只重新计算受影响的用户
+    """
+
+    def __init__(self, manager: Manager) -> None:
+        self.manager = manager
+        self.global_index: dict[str, RankIndex] = {}
+        self.group_index: dict[tuple[str, str], RankIndex] = {}
+        manager.subscribe(self.on_change)
+
+    def user_value(self, prop: Prop, user_id: str):
+        data = self.manager.data
+        user = data.user_dict.get(user_id)
+        if not user:
+            return 0
+        if prop.domain != 1:
+            return user.bank[prop.id]
+        value = 0
+        for group_id, account_id in user.accounts_map.items():
+            account = data.account_dict.get(account_id)
+            group = data.group_dict.get(group_id)
+            if account and group:
+                value += account.bank[prop.id] * group.level
+        return value
+
+    def member_value(self, prop: Prop, group_id: str, user_id: str):
+        data = self.manager.data
+        group = data.group_dict.get(group_id)
+        if not group or not (account_id := group.accounts_map.get(user_id)):
+            return 0
+        user = data.user_dict.get(user_id)
+        account = data.account_dict.get(account_id)
+        if not (user and account):
+            return 0
+        return prop.N(user, account)
+
+    def global_ranking(self, prop: Prop):
+        """总排名索引"""
+        if (index := self.global_index.get(prop.id)) is None:
+            self.manager.data.load_all()
+            index = self.global_index[prop.id] = RankIndex()
+            for user_id in self.manager.data.user_dict:
+                index.set(user_id, self.user_value(prop, user_id))
+        return index
+
+    def group_ranking(self, prop: Prop, group_id: str):
+        """群内排名索引"""
+        if (index := self.group_index.get((group_id, prop.id))) is None:
+            index = self.group_index[group_id, prop.id] = RankIndex()
+            group = self.manager.data.group_dict.get(group_id)
+            for user_id in group.accounts_map if group else ():
+                index.set(user_id, self.member_value(prop, group_id, user_id))
+        return index
+
+    def refresh(self, prop_id: str, user_id: str, group_ids):
+        """重新计算用户在总排名及群内排名中的数量"""
+        if not (prop := self.manager.props_library.get(prop_id)):
+            return
+        if (index := self.global_index.get(prop_id)) is not None:
+            index.set(user_id, self.user_value(prop, user_id))
+        for group_id in group_ids:
+            if (index := self.group_index.get((group_id, prop_id))) is not None:
+                index.set(user_id, self.member_value(prop, group_id, user_id))
+
+    def on_change(self, field: str, bank: str, record: User | Group | Account, key: str, delta: int):
+        match field, bank:
+            case "user_dict", "bank":
+                self.refresh(key, record.id, record.accounts_map)
+            case "account_dict", "bank":
+                self.refresh(key, record.user_id, (record.group_id,))
+            case "account_dict", "record":
+                prop_ids = {prop_id for group_id, prop_id in self.group_index if group_id == record.group_id}
+                prop_ids.update(self.global_index)
+                for prop_id in prop_ids:
+                    self.refresh(prop_id, record.user_id, (record.group_id,))
+            case "group_dict", "level":
+                for prop_id, index in self.global_index.items():
+                    prop = self.manager.props_library.get(prop_id)
+                    if prop and prop.domain == 1:
+                        for user_id in record.accounts_map:
+                            index.set(user_id, self.user_value(prop, user_id))
@@ -9,6 +9,7 @@ def verification():
     """
     数据校验
     """
+    manager.data.load_all()
     user_dict = manager.data.user_dict
     group_dict = manager.data.group_dict
     account_dict = manager.data.account_dict
@@ -18,26 +19,26 @@ def verification():
     for user_id, user in user_dict.items():
         user.id = user_id
         # 清理未持有的道具
-        user.bank = Counter({k: v for k, v in user.bank.items() if v > 0 and k in props_library})
+        user.bank.replace({k: v for k, v in user.bank.items() if v > 0 and k in props_library})
         # 删除无效及未持有的股票
-        invest = user.invest = Counter({k: v for k, v in user.invest.items() if k in group_dict and v})
+        user.invest.replace({k: v for k, v in user.invest.items() if k in group_dict and v})
         # 股票数检查
-        stock_check += Counter(invest)
+        stock_check += Counter(user.invest)
         for group_id, accounts_id in user.accounts_map.items():
             account = account_dict[accounts_id]
             account.user_id = user_id
             account.group_id = group_id
             # 清理未持有的道具
-            account.bank = Counter({k: v for k, v in account.bank.items() if v > 0 and k in props_library})
+            account.bank.replace({k: v for k, v in account.bank.items() if v > 0 and k in props_library})
             group_dict[group_id].accounts_map[user_id] = accounts_id
     # 检查 group_dict
     for group_id, group in group_dict.items():
         # 清理未持有的道具
-        group.bank = Counter({k: v for k, v in group.bank.items() if v > 0 and k in props_library})
+        group.bank.replace({k: v for k, v in group.bank.items() if v > 0 and k in props_library})
         # 删除无效及未持有的股票
-        group.invest = Counter({k: v for k, v in group.invest.items() if k in group_dict and v})
+        group.invest.replace({k: v for k, v in group.invest.items() if k in group_dict and v})
         # 修正公司等级
-        group.level = sum(group.extra.setdefault("revolution_achieve", {}).values()) + 1
+        manager.data.set_level(group, sum(group.extra.setdefault("revolution_achieve", {}).values()) + 1)
         stock = group.stock
         if not stock:
             continue
@@ -46,6 +47,8 @@ def verification():
         issuance = 20000 * group.level
         stock.issuance = issuance
         group.invest[group_id] = issuance - stock_check[group_id]
+    manager.data.touch_all()
+    manager.group_totals.clear()
 
 
 # 数据验证
@@ -60,8 +63,8 @@ async def _(event: Event):
 @Check().superuser().check
 @scheduler.scheduled_job("cron", minute="*/10", misfire_grace_time=120)
 async def _():
-    manager.save()
-    print("游戏数据已保存！")
+    pause = await manager.async_save()
+    print(f"游戏数据已保存！事件循环暂停 {round(pause * 1000, 1)}ms")
 
 
 @plugin.handle({"刷新每日"}, {"permission"})
@@ -69,15 +72,16 @@ async def _():
 @scheduler.scheduled_job("cron", hour=0, misfire_grace_time=120)
 async def _():
     revolution_today = datetime.today().weekday() in {4, 5, 6}
+    manager.data.load_all()
     for user in manager.data.user_dict.values():
         bank = {k: (v - 1) if prop.flow == 0 else v for k, v in user.bank.items() if (prop := manager.props_library.get(k))}
-        user.bank = Counter(bank)
+        user.bank.replace(bank)
     for account in manager.data.account_dict.values():
         # 周末刷新重置签到
         account.extra["revolution"] = revolution_today
         # 群内道具有效期 - 1天
         bank = {k: (v - 1) if prop.flow == 0 else v for k, v in account.bank.items() if (prop := manager.props_library.get(k))}
-        account.bank = Counter(bank)
+        account.bank.replace(bank)
     verification()
     print("每日签到已刷新")
 
@@ -87,5 +91,6 @@ async def _():
 @Check().superuser().check
 @scheduler.scheduled_job("cron", hour="*/4", misfire_grace_time=120)
 async def _():
-    manager.backup()
+    pause = await manager.async_backup()
+    print(f"游戏数据已备份！事件循环暂停 {round(pause * 1000, 1)}ms")
     print(manager.clean_backup(604800))
@@ -1,22 +1,52 @@
-import matplotlib.pyplot as plt
-import mplfinance as mpf
-import pandas as pd
+import math
 import numpy as np
+import matplotlib
 from datetime import datetime
 from io import BytesIO
 from PIL import Image, ImageDraw
-from .core.data import Prop, Stock
+from PIL.Image import Image as IMG
+from .core.data import Prop, Stock, Group
+from .core import kline
 from clovers.utils.linecard import FontManager, linecard
 from clovers.utils.tools import format_number
-from .main import config_data
+from .main import config_data, plugin, manager
 
 fontname = config_data.fontname
 fallback = config_data.fallback_fonts
 
-font_manager = FontManager(fontname, fallback, (30, 40, 60))
+font_manager = FontManager(fontname, fallback, (14, 21, 30, 40, 60))
 
-plt.rcParams["font.family"] = fontname
-plt.rcParams["font.sans-serif"] = fallback
+matplotlib.rcParams["font.family"] = fontname
+matplotlib.rcParams["font.sans-serif"] = fallback
+
+
+def charting():
+    """
+    K线图所用的 pandas 与 mplfinance
+        导入需要约 1 秒及数十 MB 内存，在首次绘制K线图时导入，渲染进程在启动时导入
+    """
+    import pandas
+    import mplfinance
+
+    return pandas, mplfinance
+
+
+def preload():
+    """绘图进程的初始化：载入字体及绘图库"""
+    for size in (14, 21, 30, 40, 60):
+        font_manager.font(size)
+    text_to_image("preload")
+    charting()
+
+
+@plugin.startup
+async def _():
+    manager.renderer.start(preload)
+
+
+@plugin.shutdown
+async def _():
+    manager.renderer.shutdown()
 
 
 def text_to_image(text: str, font_size=40, width=880, **kwargs):
@@ -83,15 +113,15 @@ def invest_card(data: list[tuple[Stock, int]], tip: str | None = None):
     return linecard(info, font_manager, 40, width=880)
 
 
-AVATAR_MASK = Image.new("RGBA", (260, 260), (255, 255, 255, 0))
-ImageDraw.Draw(AVATAR_MASK).ellipse(((0, 0), (260, 260)), fill="black")
-
-
-def avatar_card(avatar: bytes | None, nickname: str, lines: list[str]):
+def avatar_card(avatar: IMG | None, nickname: str, lines: list[str]):
+    """
+    资料卡
+        avatar:260px 圆形头像缩略图
+    """
     font = font_manager.font(40)
     canvas = Image.new("RGBA", (880, 300))
     if avatar:
-        canvas.paste(Image.open(BytesIO(avatar)).resize((260, 260)), (20, 20), AVATAR_MASK)
+        canvas.paste(avatar, (20, 20), avatar)
     draw = ImageDraw.Draw(canvas)
     draw.text((300, 40), f"{nickname}", fill=(0, 0, 0), font=font)
     draw.line(((300, 120), (860, 120)), fill="gray", width=4)
@@ -106,26 +136,19 @@ def avatar_card(avatar: bytes | None, nickname: str, lines: list[str]):
     return canvas
 
 
-def candlestick(figsize: tuple[float, float], length: int, history: list[tuple[float, float]]):
+def candlestick(figsize: tuple[float, float], bars: list[list[float]], datetime_format: str = "%H:%M"):
     """
     生成股价K线图
         figsize:图片尺寸
-        length:OHLC采样长度
-        history:历史数据
+        bars:K线 [开始时间, 开盘, 最高, 最低, 收盘]
+        return:PNG
     """
-    t, price = zip(*history)
-    l = len(t)
-    t = [t[i : i + length] for i in range(0, l, length)]
-    price = [price[i : i + length] for i in range(0, l, length)]
-    D, O, H, L, C = [], [], [], [], []
-    for i in range(len(price)):
-        D.append(datetime.fromtimestamp(t[i][0]))
-        O.append(price[i][0])
-        H.append(max(price[i]))
-        L.append(min(price[i]))
-        C.append(price[i][-1])
-    data = pd.DataFrame({"date": D, "open": O, "high": H, "low": L, "close": C})
-    data = data.set_index("date")
+    pd, mpf = charting()
+    data = pd.DataFrame(
+        [bar[1:] for bar in bars],
+        index=pd.DatetimeIndex([datetime.fromtimestamp(bar[0]) for bar in bars], name="date"),
+        columns=["open", "high", "low", "close"],
+    )
     style = mpf.make_mpf_style(
         base_mpf_style="charles",
         marketcolors=mpf.make_marketcolors(up="#006340", down="#a02128", edge="none"),
@@ -139,13 +162,25 @@ def candlestick(figsize: tuple[float, float], length: int, history: list[tuple[f
         type="candlestick",
         xlabel="",
         ylabel="",
-        datetime_format="%H:%M",
+        datetime_format=datetime_format,
         tight_layout=True,
         style=style,
         figsize=figsize,
         savefig=output,
     )
-    return Image.open(output)
+    return output.getvalue()
+
+
+async def kline_chart(group: Group, resolution: str = "1h"):
+    """
+    群K线图，按最后一根K线缓存
+        return:PNG，没有价格记录时为 None
+    """
+    if not (bars := manager.prices.ohlc(group.id, resolution)):
+        return
+    key = (group.id, resolution, *bars[-1])
+    datetime_format = kline.RESOLUTIONS[resolution][2]
+    return await manager.chart_cache.get(key, lambda: manager.renderer.run(candlestick, (9.5, 3), bars, datetime_format))
 
 
 def dist_card(
@@ -162,6 +197,10 @@ def dist_card(
         "#741b47",
     ],
 ):
+    """
+    资产分布饼图
+        左侧图例，右侧逆时针排列的扇形，第 n 块扇形向外偏移 explode[n] 个半径
+    """
     dist.sort(key=lambda x: x[0], reverse=True)
     labels = []
     x = []
@@ -176,24 +215,130 @@ def dist_card(
             x.append(sum(seg[0] for seg in dist[n:]))
             break
     n += 1
-    output = BytesIO()
+    explode = [0, 0.1, 0.19, 0.27, 0.34, 0.40, 0.45, 0.49, 0.52]
+    total = sum(value for value in x if value > 0)
+    wedges = []
+    xs, ys = [0.0], [0.0]
+    start = 0.0
+    for i, value in enumerate(x):
+        if value <= 0:
+            continue
+        end = start + 360 * value / total
+        theta = math.radians((start + end) / 2)
+        ox, oy = explode[i] * math.cos(theta), explode[i] * math.sin(theta)
+        wedges.append((i, start, end, ox, oy, theta, value))
+        xs.append(ox)
+        ys.append(oy)
+        for a in range(int(start), int(end) + 2, 2):
+            a = math.radians(min(a, end))
+            xs.append(ox + math.cos(a))
+            ys.append(oy + math.sin(a))
+        start = end
+    # 与 matplotlib 的 axis("equal") 一致：扇形的范围留 5% 边距后等比缩放，居中于绘图区
+    left, top, width, height = 484, 17, 330, 306
+    x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+    radius = min(width / (x1 - x0 or 2), height / (y1 - y0 or 2)) / 1.1
+    cx = left + width / 2 - (x0 + x1) / 2 * radius
+    cy = top + height / 2 + (y0 + y1) / 2 * radius
+    canvas = Image.new("RGBA", (880, 340))
+    # 扇形先放大绘制再缩小以抗锯齿
+    scale = 3
+    pie = Image.new("RGBA", (width * scale, height * scale))
+    draw = ImageDraw.Draw(pie)
+    pct_labels = []
+    for i, start, end, ox, oy, theta, value in wedges:
+        px = cx + ox * radius - left
+        py = cy - oy * radius - top
+        draw.pieslice(
+            ((scale * (px - radius), scale * (py - radius)), (scale * (px + radius), scale * (py + radius))),
+            -end,
+            -start,
+            fill=colors[i],
+        )
+        if (pct := 100 * value / total) >= 1:
+            r = 1.2 * radius
+            pct_labels.append((f"{pct:.1f}%", left + px + r * math.cos(theta), top + py - r * math.sin(theta)))
+    pie = pie.reduce(scale)
+    canvas.paste(pie, (left, top), pie)
+    draw = ImageDraw.Draw(canvas)
+    font = font_manager.font(21)
+    for text, tx, ty in pct_labels:
+        draw.text((tx, ty), text, fill=(0, 0, 0), font=font, anchor="mm")
+    # 图例
+    font = font_manager.font(14)
+    for i, label in enumerate(labels):
+        y = 323 - 4 - (n - i) * 21.3
+        draw.rectangle(((292, y + 6), (319, y + 15)), fill=colors[i])
+        draw.text((330, y + 11), label, fill=(0, 0, 0), font=font, anchor="lm")
+    return canvas
+
+
+curve_fit = {
+    1: lambda x: 0.339438628551138 * np.log(2.7606559801569316e-13 * x) + -0.0012286453324789554 * x + 9.310675305999386,
+    2: lambda x: 0.2622830460672209 * np.log(1.0565997436401555e-10 * x) + -0.0013800074822243364 * x + 6.079586419253099,
+    3: lambda x: 0.16563555661021917 * np.log(652.209392293454 * x) + -0.0009688421476907207 * x + -0.5084815403474984,
+    4: lambda x: -0.11977280212351049 * np.log(3.53822027614143e-11 * x) + 0.0005645672140693966 * x + -0.9186502372819698,
+    5: lambda x: -0.27071466714377795 * np.log(1.2743174700041504e-11 * x) + 0.0014031052967047675 * x + -4.106094299018067,
+    6: lambda x: -0.5213387432196357 * np.log(16.300736342820436 * x) + 0.0027842719423569447 * x + 5.3464181044586425,
+}
+
 
-    plt.figure(figsize=(6.6, 3.4))
-    plt.pie(
-        np.array(x),
-        labels=[""] * n,
-        autopct=lambda pct: "" if pct < 1 else f"{pct:.1f}%",
-        colors=colors[0:n],
-        wedgeprops={"edgecolor": "none"},
-        textprops={"fontsize": 15},
-        pctdistance=1.2,
-        explode=[0, 0.1, 0.19, 0.27, 0.34, 0.40, 0.45, 0.49, 0.52][0:n],
+def report_card(
+    nickname: str,
+    prop_star: int,
+    prop_n: int,
+    air_star: int,
+    air_n: int,
+):
+    N = prop_n + air_n
+    pt = prop_star / N
+    title = []
+
+    if not prop_n:
+        title.append("[center][color][#003300]理 想 气 体")
+    elif pt < curve_fit[1](N):
+        title.append("[center][color][#003300]很多空气")
+    elif pt < curve_fit[2](N):
+        title.append("[left][color][#003333]☆[nowrap][passport]\n[center]数据异常[nowrap][passport]\n[right]☆")
+    elif pt < curve_fit[3](N):
+        title.append("[left][color][#003366]☆ ☆[nowrap][passport]\n[center]一枚硬币[nowrap][passport]\n[right]☆ ☆")
+    elif pt < curve_fit[4](N):
+        title.append("[left][color][#003399]☆ ☆ ☆[nowrap][passport]\n[center]高斯分布[nowrap][passport]\n[right]☆ ☆ ☆")
+    elif pt < curve_fit[5](N):
+        title.append("[left][color][#0033CC]☆ ☆ ☆ ☆[nowrap][passport]\n[center]对称破缺[nowrap][passport]\n[right]☆ ☆ ☆ ☆")
+    elif pt < curve_fit[6](N):
+        title.append("[left][color][#0033FF]☆ ☆ ☆ ☆ ☆[nowrap][passport]\n[center]概率之子[nowrap][passport]\n[right]☆ ☆ ☆ ☆ ☆")
+    else:
+        title.append("[center][color][#FF0000]☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆☆")
+    title.append(
+        "----\n"
+        f"抽卡次数 {N}[nowrap]\n"
+        f"[pixel][450]空气占比 {round(air_n*100/N,2)}%\n"
+        f"获得☆ {prop_star}[nowrap]\n"
+        f"[pixel][450]获得☆ {air_star}\n"
+        f"道具平均☆ {round(prop_star/(prop_n or 1),3)}[nowrap]\n"
+        f"[pixel][450]空气平均☆ {round(air_star/(air_n or 1),3)}\n"
+        f"数据来源：{nickname}"
     )
-    plt.legend(labels, loc=(-0.6, 0), frameon=False)
-    plt.axis("equal")
-    plt.subplots_adjust(top=0.95, bottom=0.05, left=0.4, hspace=0, wspace=0)
-    plt.savefig(output, format="png", dpi=100, transparent=True)
-    plt.close()
-    canvas = Image.new("RGBA", (880, 340))
-    canvas.paste(Image.open(output), (220, 0))
+    return text_to_image("\n".join(title) + endline("抽卡报告"))
+
+
+def draw_rank(data: list[tuple[str, int, IMG | None]]) -> IMG:
+    """
+    排名信息
+        data:(昵称, 数量, 60px 圆形头像缩略图)
+    """
+    first = data[0][1]
+    canvas = Image.new("RGBA", (880, 80 * len(data) + 20))
+    draw = ImageDraw.Draw(canvas)
+    y = 20
+    i = 1
+    font = font_manager.font(40)
+    for nickname, v, avatar in data:
+        if avatar:
+            canvas.paste(avatar, (5, y), avatar)
+        draw.rectangle(((70, y + 10), (70 + int(v / first * 790), y + 50)), fill="#99CCFFCC")
+        draw.text((80, y + 10), f"{i}.{nickname} {format_number(v)}", fill=(0, 0, 0), font=font)
+        y += 80
+        i += 1
     return canvas
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+import matplotlib
+from pathlib import Path
+from clovers.core.config import config as clovers_config
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 导入插件前设置配置：临时存档目录，matplotlib 自带的字体，在主进程中绘图
+os.environ["XDG_DATA_DIRS"] = matplotlib.get_data_path()
+clovers_config["clovers_leafgame"] = {
+    "main_path": tempfile.mkdtemp(prefix="LeafGames"),
+    "fontname": "DejaVuSans",
+    "fallback_fonts": [],
+    "render_workers": 0,
+}
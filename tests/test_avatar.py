@@ -0,0 +1,96 @@
+import time
+import asyncio
+import threading
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+from clovers_leafgame.core.avatar import AvatarCache
+
+
+def png(color: str):
+    output = BytesIO()
+    Image.new("RGB", (8, 8), color).save(output, "PNG")
+    return output.getvalue()
+
+
+class Server(ThreadingHTTPServer):
+    """头像服务器：/avatar 带 ETag，If-None-Match 相同时返回 304；/slow 延迟响应"""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.image = png("red")
+        self.etag = '"1"'
+        self.requests: list[tuple[str, int, str | None]] = []
+        self.delay = 0.0
+
+    def url(self, path: str):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: Server
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/slow":
+            time.sleep(server.delay)
+        if_none_match = self.headers.get("If-None-Match")
+        status = 304 if if_none_match == server.etag else 200
+        server.requests.append((self.path, status, if_none_match))
+        self.send_response(status)
+        self.send_header("ETag", server.etag)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(server.image)))
+        self.end_headers()
+        self.wfile.write(server.image)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_avatar_cache(tmp_path):
+    server = Server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = server.url("/avatar")
+
+    async def main():
+        # 首次请求下载并写入磁盘
+        cache = AvatarCache(tmp_path, ttl=3600)
+        assert await cache.fetch(url) == server.image
+        assert cache.file(url, ".img").read_bytes() == server.image
+        assert server.requests == [("/avatar", 200, None)]
+        assert (await cache.thumbnail(url, 60)).size == (60, 60)
+
+        # 未过期时不再请求，重启后从磁盘读取
+        assert await AvatarCache(tmp_path, ttl=3600).fetch(url) == server.image
+        assert len(server.requests) == 1
+
+        # 过期后带 ETag 重新请求，304 时继续使用缓存
+        cache = AvatarCache(tmp_path, ttl=0)
+        assert await cache.fetch(url) == server.image
+        assert server.requests[-1] == ("/avatar", 304, '"1"')
+
+        # 头像更换后下载新图并删除旧的缩略图
+        server.image, server.etag = png("blue"), '"2"'
+        assert await cache.fetch(url) == server.image
+        assert server.requests[-1] == ("/avatar", 200, '"1"')
+        assert cache.file(url, ".img").read_bytes() == server.image
+        assert not cache.file(url, "_60.png").exists()
+
+        # 超时时使用过期的缓存，没有缓存时返回 None
+        slow = server.url("/slow")
+        assert await AvatarCache(tmp_path, ttl=3600).fetch(slow) == server.image
+        server.delay = 1.0
+        cache = AvatarCache(tmp_path, ttl=0, timeout=0.2)
+        assert await cache.fetch(slow) == server.image
+        cache.file(slow, ".img").unlink()
+        assert await AvatarCache(tmp_path, ttl=0, timeout=0.2).fetch(slow) is None
+
+    try:
+        asyncio.run(main())
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,40 @@
+import asyncio
+from clovers_leafgame.core import journal as journal_module
+from clovers_leafgame.core.data import DataBase, Group, Stock
+from clovers_leafgame.core.journal import Journal
+
+
+def test_replay_stock(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_module, "SYNC_DELAY", 0)
+    saved = DataBase()
+    saved.group_dict["g"] = Group(id="g", stock=Stock(id="g", name="test", value=100, floating=100.0, issuance=20000, time=0))
+    document = saved.model_dump_json()
+
+    data = DataBase.model_validate_json(document)
+    journal = Journal(tmp_path)
+    journal.open(0)
+    data.set_journal(journal)
+
+    async def main():
+        # 购买：扣款，股票价格与买单
+        group = data.group_dict["g"]
+        data.user("u").bank["std_gold"] -= 50
+        data.user("u").invest["g"] += 10
+        group.stock.floating = 123.5
+        group.stock.value = 150
+        group.stock.bids["u"] = (5, 2.5, 13)
+        data.touch_stock(group)
+        assert journal.sync_pending
+        await asyncio.sleep(0.01)
+        assert not journal.sync_pending
+
+    asyncio.run(main())
+    journal.close()
+
+    replayed = DataBase.model_validate_json(document)
+    assert Journal(tmp_path).replay(replayed) == 3
+    stock = replayed.group_dict["g"].stock
+    assert stock == data.group_dict["g"].stock
+    assert stock.bids == {"u": (5, 2.5, 13)}
+    assert replayed.user_dict["u"].invest["g"] == 10
+    assert "g" in replayed.pop_dirty()["group_dict"]
@@ -0,0 +1,22 @@
+import asyncio
+import pytest
+from clovers_leafgame.main import manager
+
+
+def test_async_save_failure(monkeypatch):
+    def snapshot(data, full=False):
+        data.clean()
+
+        def write():
+            raise OSError("disk full")
+
+        return write
+
+    monkeypatch.setattr(manager.storage, "snapshot", snapshot)
+    with pytest.raises(OSError):
+        asyncio.run(manager.async_save())
+    # 写入失败后下次保存为完整保存
+    assert manager.data.outdated
+    monkeypatch.undo()
+    manager.save()
+    assert not manager.data.outdated
@@ -0,0 +1,169 @@
+import math
+import random
+from collections import Counter
+from clovers_leafgame.core.data import Stock
+from clovers_leafgame.modules.market import core as market
+
+
+def settle_loop(floating: float, issuance: int, n: int, quote: float):
+    """逐份结算（原实现）"""
+    value = 0.0
+    settle = 0
+    if quote:
+        for _ in range(n):
+            unit = floating / issuance
+            if unit < quote:
+                break
+            value += quote
+            floating -= quote
+            settle += 1
+    else:
+        for _ in range(n):
+            unit = max(floating / issuance, 0.0)
+            value += unit
+            floating -= unit
+        settle = n
+    return floating, settle, value
+
+
+def random_order(rand: random.Random):
+    issuance = rand.choice([1, 2, 3, 7, 100, 20000, int(10 ** rand.uniform(0, 6))])
+    floating = rand.choice([0.0, -rand.uniform(0, 1e6), 10 ** rand.uniform(-3, 12)])
+    unit = floating / issuance
+    quote = rand.choice(
+        [
+            0,
+            -rand.uniform(0, 10),
+            round(rand.uniform(0, 10), 2),
+            unit * rand.uniform(0.5, 1.0),
+            unit * rand.uniform(0.999, 1.0),
+            math.ulp(floating) * rand.choice([0.25, 0.5, 1, 1.5, 3]) if floating else 0.1,
+        ]
+    )
+    n = rand.choice([1, 2, 10, rand.randint(0, 5000)])
+    return floating, issuance, n, quote
+
+
+def test_settle_quote_matches_loop():
+    rand = random.Random(22)
+    for _ in range(20000):
+        floating, issuance, n, quote = random_order(rand)
+        if not quote:
+            continue
+        assert market.settle(floating, issuance, n, quote) == settle_loop(floating, issuance, n, quote), (floating, issuance, n, quote)
+
+
+def test_settle_auto_matches_loop():
+    rand = random.Random(23)
+    for _ in range(3000):
+        floating, issuance, n, _ = random_order(rand)
+        expected = settle_loop(floating, issuance, n, 0)
+        result = market.settle(floating, issuance, n, 0)
+        assert result[1] == expected[1]
+        assert int(result[2]) == int(expected[2]), (floating, issuance, n)
+        # 浮动价格与收入只差累计舍入误差
+        assert math.isclose(result[0], expected[0], abs_tol=1e-9 * abs(floating))
+        assert math.isclose(result[2], expected[2], abs_tol=1e-9 * abs(floating))
+
+
+def test_settle_rounding():
+    # 逐份累加 3.14 共 100 次为 313.99999999999...
+    floating, settle, value = market.settle(3.14 * 20000, 100, 100, 3.14)
+    assert settle == 100
+    assert int(value) == 313
+    # 报价恰好等于最后一份的单价
+    assert market.settle(1000.0, 10, 5, 90.0) == settle_loop(1000.0, 10, 5, 90.0)
+    assert market.settle(1000.0, 10, 0, 1.0) == (1000.0, 0, 0.0)
+
+
+def test_repeat_add():
+    rand = random.Random(21)
+    for _ in range(2000):
+        s = rand.choice([0.0, rand.uniform(-1e9, 1e9), 2.0 ** rand.randint(-20, 40)])
+        step = rand.choice([rand.uniform(-1e3, 1e3), math.ulp(s or 1.0) * rand.choice([-1.5, -0.5, 0.5, 0.75, 1.5, 2.5])])
+        n = rand.randint(0, 3000)
+        expected = s
+        for _ in range(n):
+            expected += step
+        assert market.repeat_add(s, step, n) == (expected, n), (s, step, n)
+
+
+def buy_loop(floating: float, value: float, issuance: int, n: int, limit: float, gold: float):
+    """逐份购买（原实现）"""
+    cost = 0.0
+    count = 0
+    reason = None
+    for _ in range(n):
+        unit = max(floating, value) / issuance
+        if unit > limit:
+            reason = "limit"
+            break
+        cost += unit
+        if cost > gold:
+            cost -= unit
+            reason = "gold"
+            break
+        floating += unit
+        count += 1
+    return count, cost, floating, reason
+
+
+def random_buy(rand: random.Random):
+    issuance = rand.choice([1, 2, 100, 20000, int(10 ** rand.uniform(0, 6))])
+    value = rand.choice([0.0, 10 ** rand.uniform(0, 9)])
+    floating = rand.choice([value, value * rand.uniform(0.5, 1.5), 10 ** rand.uniform(0, 9), -rand.uniform(0, 1e6)])
+    unit = max(floating, value) / issuance
+    n = rand.choice([1, 2, rand.randint(0, 3000)])
+    limit = rand.choice([math.inf, unit * rand.uniform(0.9, 1.5), unit * rand.uniform(1, 1.01), 0.0])
+    gold = rand.choice([math.inf, unit * rand.uniform(0, 2 * n + 1), rand.uniform(0, 1e9), 0.0])
+    return floating, value, issuance, n, limit, gold
+
+
+def test_buy_quote_matches_loop():
+    rand = random.Random(21)
+    reasons = Counter()
+    for _ in range(5000):
+        args = random_buy(rand)
+        floating, value, issuance, n, limit, gold = args
+        expected = buy_loop(*args)
+        count, cost, after, reason = market.buy_quote(*args)
+        reasons[reason] += 1
+        if count != expected[0]:
+            # 只允许在价格或金币恰好处于上限时因舍入差一份
+            assert abs(count - expected[0]) == 1, args
+            m = min(count, expected[0])
+            unit = max(buy_loop(floating, value, issuance, m, math.inf, math.inf)[2], value) / issuance
+            total = buy_loop(floating, value, issuance, m + 1, math.inf, math.inf)[1]
+            assert math.isclose(unit, limit, rel_tol=1e-9) or math.isclose(total, gold, rel_tol=1e-9), args
+            continue
+        assert reason == expected[3], args
+        assert math.isclose(cost, expected[1], rel_tol=1e-9, abs_tol=1e-9), args
+        assert math.isclose(after, expected[2], rel_tol=1e-9, abs_tol=1e-9), args
+    assert reasons["limit"] and reasons["gold"] and reasons[None]
+
+
+def test_buy_quote_cases():
+    # 金币不足：单价 100，金币只够 3 份
+    assert market.buy_quote(5e5, 1e6, 10000, 10, math.inf, 350) == (3, 300.0, 5e5 + 300.0, "gold")
+    # 单价超过限制：浮动价格低于公司价值时单价不变，之后上涨
+    count, cost, after, reason = market.buy_quote(1e6, 1e6, 10000, 10, 100.0, math.inf)
+    assert (count, reason) == (1, "limit") and cost == 100.0
+    # 全部买入
+    assert market.buy_quote(1e6, 1e6, 10000, 0, math.inf, math.inf) == (0, 0.0, 1e6, None)
+    assert market.buy_quote(5e5, 1e6, 10000, 5, 100.0, 500.0) == (5, 500.0, 5e5 + 500.0, None)
+    # 已售空：没有可买的数量
+    assert market.buy_quote(1e6, 1e6, 10000, 0, 100.0, 0.0) == (0, 0.0, 1e6, None)
+
+
+def test_close_and_cancel():
+    stock = Stock(id="s", name="s", issuance=100, value=100, floating=100.0, time=0)
+    book = market.order_book(stock)
+    book.ask("a", 5, 2.0)
+    book.bid("b", 3, 1.0, 3)
+    book.bid("c", 2, 1.5, 0)
+    assert book.cancel("a")
+    assert not book.cancel("a")
+    assert stock.exchange == {}
+    assert market.close(stock) == [("b", 3)]
+    assert stock.bids == {}
+    assert "s" not in market.books
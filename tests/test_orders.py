@@ -0,0 +1,49 @@
+import time
+import asyncio
+from clovers_leafgame.main import manager, plugin
+from clovers_leafgame.core.data import Stock
+from clovers_leafgame.modules.market import core as market
+from clovers_leafgame.item import STD_GOLD
+
+
+def command(text: str, **kwargs):
+    async def main():
+        result = []
+        for key, event in plugin(text).items():
+            event.kwargs = {"permission": 3, "user_id": "1", "group_id": "100"} | kwargs
+            result.append(await plugin.handles[key](event))
+        return result
+
+    return asyncio.run(main())
+
+
+def stock_group(group_id: str):
+    manager.new_account(f"{group_id}-owner", group_id)
+    group = manager.data.group(group_id)
+    group.stock = Stock(id=group_id, name=f"{group_id}-stock", issuance=20000, value=10**6, floating=10**6, time=time.time())
+    manager.index_group(group)
+    return group
+
+
+def test_orders_cleared_on_cancel():
+    deceased = stock_group("orders-a")
+    heir = stock_group("orders-b")
+    buyer = manager.data.user("orders-buyer")
+    buyer.bank[STD_GOLD.id] = 1000
+    book = market.order_book(deceased.stock)
+    book.bid(buyer.id, 10, 20.0, 200)
+    buyer.bank[STD_GOLD.id] -= 200
+
+    # 继承时退还被继承群股票的买单
+    command(f"继承公司账户 {deceased.stock.name} -> {heir.stock.name}")
+    assert deceased.id not in manager.data.group_dict
+    assert buyer.bank[STD_GOLD.id] == 1000
+    assert deceased.id not in market.books
+
+    # 注销的用户的订单被撤销，不会在撮合时重新创建用户
+    book = market.order_book(heir.stock)
+    book.bid(buyer.id, 10, 20.0, 200)
+    book.ask("orders-seller", 5, 0.0)
+    manager.data.cancel_user(buyer.id)
+    assert heir.stock.bids == {}
+    assert "orders-seller" in heir.stock.exchange
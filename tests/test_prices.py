@@ -0,0 +1,27 @@
+import json
+from clovers_leafgame.core.prices import PriceStore
+
+
+def test_snapshot_and_remove(tmp_path):
+    prices = PriceStore(tmp_path)
+    for i in range(20):
+        prices.record(f"s{i}", 60.0 * i, float(i))
+    task = prices.snapshot()
+    # 复制索引后新增的股票不影响本次写入
+    prices.record("late", 0.0, 1.0)
+    task()
+    assert len(json.loads((tmp_path / "index.json").read_text())) == 20
+    prices.snapshot()()
+    assert "late" in PriceStore(tmp_path).index
+
+    # 删除后槽位被新股票重用并清空，重新注册的股票没有旧的价格历史
+    slot = prices.index["s3"]
+    prices.remove("s3")
+    assert len(prices.history("s3")) == 0
+    prices.record("s3", 1e6, 5.0)
+    assert prices.index["s3"] == slot
+    assert prices.history("s3").tolist() == [[1e6, 5.0]]
+    prices.snapshot()()
+    reopened = PriceStore(tmp_path)
+    assert reopened.history("s3").tolist() == [[1e6, 5.0]]
+    assert reopened.history("s4").tolist() == [[240.0, 4.0]]
@@ -0,0 +1,29 @@
+import random
+from clovers_leafgame.core import rank
+from clovers_leafgame.core.rank import RankIndex
+
+
+def test_rank_index_matches_sorted_list(monkeypatch):
+    # 段很短时拆分与删除段都会经常发生
+    monkeypatch.setattr(rank, "LOAD", 4)
+    rng = random.Random(0)
+    index = RankIndex()
+    values: dict[str, int] = {}
+    for step in range(20000):
+        key = f"u{rng.randrange(300)}"
+        value = rng.choice([0, 0, rng.randrange(-5, 50)])
+        if rng.random() < 0.5:
+            index.set(key, value)
+            values[key] = value
+        else:
+            index.update(key, value)
+            values[key] = values.get(key, 0) + value
+        if step % 97 == 0:
+            order = sorted((-n, key) for key, n in values.items() if n)
+            assert list(index) == [(key, -n) for n, key in order]
+            assert len(index) == len(order)
+            assert index.top(10) == [(key, -n) for n, key in order[:10]]
+            for i, (n, key) in enumerate(order):
+                assert index.rank(key) == i + 1
+                assert index[key] == -n
+            assert index.rank("missing") is None
@@ -0,0 +1,29 @@
+import asyncio
+import pytest
+from clovers_leafgame.core.render import Renderer, Card
+from clovers_leafgame.output import preload, text_to_image
+
+
+def fail():
+    raise ValueError("bug")
+
+
+def test_renderer():
+    async def main():
+        renderer = Renderer(1)
+        renderer.start(preload)
+        try:
+            image = await renderer.draw(Card(text_to_image, "test"))
+            assert image.size[0] == 880
+            # 渲染进程不创建管理器
+            assert await renderer.run(eval, "__import__('clovers_leafgame.main').main.manager is None")
+            # 不能 pickle 的函数在事件循环中执行
+            assert await renderer.run(lambda: 1) == 1
+            # 绘图函数的异常不会被当作 pickle 错误
+            with pytest.raises(ValueError):
+                await renderer.run(fail)
+            assert renderer.executor is not None
+        finally:
+            renderer.shutdown()
+
+    asyncio.run(main())
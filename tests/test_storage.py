@@ -0,0 +1,154 @@
+import pytest
+from clovers_leafgame.core.data import DataBase, User, Account
+from clovers_leafgame.core.totals import GroupTotals
+from clovers_leafgame.manager import Manager
+from clovers_leafgame.core.storage import JSONStorage, SQLiteStorage, ShardStorage, migrate
+
+
+def test_migrate(tmp_path):
+    data = DataBase()
+    data.user_dict["u"] = User(id="u", name="test")
+    JSONStorage(tmp_path).snapshot(data, True)()
+    file = tmp_path / "russian_data.db"
+    storage = migrate(tmp_path, file)
+    assert storage.load().user_dict["u"].name == "test"
+    assert not file.with_suffix(".tmp").exists()
+
+
+def test_migrate_failure(tmp_path):
+    (tmp_path / "russian_data.json").write_text("{", encoding="utf8")
+    file = tmp_path / "russian_data.db"
+    with pytest.raises(Exception):
+        migrate(tmp_path, file)
+    assert not file.exists()
+    assert [f.name for f in tmp_path.iterdir()] == ["russian_data.json"]
+
+
+def test_shard_dash_ids(tmp_path):
+    data = DataBase()
+    data.register(Account(user_id="a-b", group_id="c-d"))
+    data.account_dict["a-b-c-d"].bank["gold"] = 10
+    storage = ShardStorage(tmp_path, evict_after=1)
+    storage.snapshot(data, True)()
+
+    # 账户 id 按 "-" 拆分会找到群 "d"
+    data = storage.load()
+    assert not storage.loaded
+    account = data.account_dict["a-b-c-d"]
+    assert storage.loaded == {"c-d"}
+    account.bank["gold"] += 5
+    storage.snapshot(data)()
+    assert ShardStorage(tmp_path).load().account_dict["a-b-c-d"].bank["gold"] == 15
+
+
+def test_shard_evict_keeps_feed(tmp_path):
+    data = DataBase()
+    for user_id in ("u-1", "u-2"):
+        data.register(Account(user_id=user_id, group_id="g-1"))
+        data.account_dict[f"{user_id}-g-1"].bank["gold"] = 10
+    storage = ShardStorage(tmp_path, evict_after=1)
+    storage.snapshot(data, True)()
+    data = storage.load()
+    totals = GroupTotals()
+    totals.bind(data)
+    data.set_listeners([totals.on_change])
+    assert totals.total(data.group_dict["g-1"], "gold") == 20
+
+    # 移出内存不是注销，订阅者的合计保留，重新加载后继续增减
+    storage.snapshot(data)()
+    assert "g-1" not in storage.loaded
+    data.account_dict["u-1-g-1"].bank["gold"] += 5
+    assert totals.total(data.group_dict["g-1"], "gold") == 25
+
+
+def test_lookup_does_not_mark_dirty():
+    data = DataBase()
+    data.user("u")
+    data.group("g")
+    assert set(data.pop_dirty()) == {"user_dict", "group_dict"}
+    data.user("u").name = "test"
+    data.group("g")
+    assert not data.pop_dirty()
+    data.user("u").bank["gold"] += 1
+    assert set(data.pop_dirty()) == {"user_dict"}
+
+
+def test_stale_delta_skipped(tmp_path):
+    storage = JSONStorage(tmp_path)
+    data = DataBase()
+    data.user("u").name = "a"
+    storage.snapshot(data, True)()
+    data.user("u").name = "b"
+    data.touch(data.user("u"))
+    storage.snapshot(data)()
+    assert JSONStorage(tmp_path).load().user_dict["u"].name == "b"
+
+    # 完整保存后没能删除旧的增量记录：旧增量不能覆盖更新的完整存档
+    stale = storage.DELTA_PATH.read_bytes()
+    data.user("u").name = "c"
+    data.touch(data.user("u"))
+    storage.snapshot(data, True)()
+    storage.DELTA_PATH.write_bytes(stale)
+    assert JSONStorage(tmp_path).load().user_dict["u"].name == "c"
+
+
+def test_torn_delta_line(tmp_path):
+    storage = JSONStorage(tmp_path)
+    data = DataBase()
+    data.user("u").bank["std"] = 100
+    storage.snapshot(data, True)()
+    for _ in range(2):
+        data.user("u").bank["std"] += 10
+        storage.snapshot(data)()
+
+    # 第二次追加时中断：最后一行不完整
+    lines = storage.DELTA_PATH.read_bytes().splitlines(keepends=True)
+    storage.DELTA_PATH.write_bytes(lines[0] + lines[1][:20])
+    storage = JSONStorage(tmp_path)
+    data = storage.load()
+    assert data.user_dict["u"].bank["std"] == 110
+    assert storage.DELTA_PATH.read_bytes() == lines[0]
+
+    # 截断后新的增量从新的一行开始
+    data.user("u").bank["std"] += 5
+    storage.snapshot(data)()
+    assert JSONStorage(tmp_path).load().user_dict["u"].bank["std"] == 115
+
+
+class CrashBeforeExtra:
+    """写入 extra（日志世代）前中断的数据库连接"""
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *args):
+        return self.conn.__exit__(*args)
+
+    def execute(self, sql: str, *args):
+        if "INTO extra" in sql:
+            raise OSError("crash")
+        return self.conn.execute(sql, *args)
+
+
+def test_sqlite_crash_during_save(tmp_path):
+    manager = Manager(tmp_path, storage="sqlite", render_workers=0)
+    for user_id in ("a", "b", "c"):
+        manager.data.user(user_id).bank["std"] = 100
+    manager.save(True)
+    for user_id in ("a", "b", "c"):
+        manager.data.user(user_id).bank["std"] += 10
+    conn = manager.storage.conn
+    manager.storage.conn = CrashBeforeExtra(conn)
+    with pytest.raises(OSError):
+        manager.save()
+    conn.close()
+
+    # 重启后记录与日志世代一致，日志中的修改只应用一次
+    manager = Manager(tmp_path, storage="sqlite", render_workers=0)
+    assert [manager.data.user_dict[user_id].bank["std"] for user_id in ("a", "b", "c")] == [110, 110, 110]
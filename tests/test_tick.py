@@ -0,0 +1,36 @@
+import time
+import asyncio
+from clovers_leafgame.main import manager, plugin
+from clovers_leafgame.core.data import Stock
+
+
+async def tick():
+    for key, event in plugin("刷新市场").items():
+        event.kwargs = {"permission": 3, "user_id": "1", "group_id": "100"}
+        await plugin.handles[key](event)
+
+
+def test_group_cancelled_during_tick():
+    for g in range(200):
+        group_id = f"tick{g}"
+        for u in range(3):
+            manager.new_account(f"tick-user{u}", group_id)
+        group = manager.data.group(group_id)
+        group.stock = Stock(id=group_id, name=group_id, issuance=20000, value=1e6, floating=1e6, time=time.time())
+        group.bank["0"] = 1000
+    manager.data.pop_dirty()
+
+    async def main():
+        async def cancel():
+            await asyncio.sleep(0)
+            manager.data.cancel_group("tick150")
+
+        task = asyncio.create_task(cancel())
+        await tick()
+        await task
+
+    asyncio.run(main())
+    assert "tick150" not in manager.data.group_dict
+    assert manager.data.pop_dirty()["group_dict"]["tick150"] is None
+    assert len(manager.prices.history("tick149")) == 1
+    assert len(manager.prices.history("tick150")) == 0